@@ -67,8 +67,8 @@ try:        # Py3k compatibility
 except NameError:
     basestring = (bytes, str)
 
-repo_dir = subprocess.Popen(['git', 'rev-parse', '--show-toplevel'], stdout=subprocess.PIPE).communicate()[0].rstrip().decode('utf-8')
-executable = os.path.join(repo_dir, "dependencies/exiftool/exiftool")
+dependencies_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+executable = os.path.join(dependencies_dir, "exiftool", "exiftool")
 """The name of the executable to run.
 
 If the executable is not located in one of the paths listed in the
@@ -0,0 +1,22 @@
+#! /usr/bin/env python3
+#
+# 2026-10-16
+# CC-0 Public Domain
+
+"""
+Image archive package. Submodules are imported on first attribute access,
+so that 'import imagearchive' stays cheap for short-lived processes.
+"""
+
+_submodules = ('catalog', 'compression', 'config', 'diff', 'directories',
+        'loader', 'manifest', 'migrations', 'query', 'schema', 'store',
+        'transfer', 'utils')
+
+def __getattr__(name):
+    if name in _submodules:
+        import importlib
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals()) + list(_submodules))
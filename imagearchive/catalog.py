@@ -0,0 +1,327 @@
+#! /usr/bin/env python3
+#
+# 2026-10-16
+# CC-0 Public Domain
+
+"""
+Flat catalog files in JSON, JSON Lines and Parquet formats
+"""
+
+import sys
+import json
+import operator
+from collections.abc import Mapping
+
+catalog_formats = {'json': '.json', 'jsonl': '.jsonl', 'parquet': '.parquet'}
+
+# Row filters are (column, operator, value) triples, all of which must hold,
+# e.g., [('media_type', 'startswith', 'image')]. Missing values never match.
+filter_operators = {
+        '==': operator.eq,
+        '!=': operator.ne,
+        '<': operator.lt,
+        '<=': operator.le,
+        '>': operator.gt,
+        '>=': operator.ge,
+        'in': lambda field, value: field in value,
+        'not in': lambda field, value: field not in value,
+        'startswith': lambda field, value: str(field).startswith(value),
+        }
+
+# File-level fields of a flat record, as from utils.catalog_file()
+file_fields = ('file_path', 'media_type', 'file_size', 'file_created_datetime',
+        'file_modified_datetime', 'checksum', 'uuid', 'duplicate_of')
+_file_fields = frozenset(file_fields)
+
+def record_key(record):
+    """Identifies a flat record by its uuid or, for files without one (e.g.,
+    tag files and duplicates), by its path."""
+    return record.get('uuid') or record['file_path']
+
+def metadata_layer(metadata):
+    """
+    Returns a copy of a directory's (inherited) metadata with interned keys
+    and string values, to be shared by the CatalogRecord of every file in
+    the directory. Layers are never modified once built.
+    """
+    return {sys.intern(k): sys.intern(v) if isinstance(v, str) else v
+            for k, v in metadata.items()}
+
+_empty_layer = {}
+
+class CatalogRecord(Mapping):
+
+    """Flat catalog record of one file, as a read-only mapping
+
+    File-level fields are kept in slots, and the metadata inherited from
+    directories in a layer shared with every other file of the directory
+    (see metadata_layer()), rather than each record holding its own copy of
+    every inherited key. Own fields take precedence, as in
+    {**inherited, **fields}. Records compare equal to the equivalent dicts;
+    use to_dict() for a plain, modifiable dict.
+    """
+
+    __slots__ = file_fields + ('_extra', '_inherited')
+
+    def __init__(self, fields, inherited=_empty_layer):
+        """
+        :fields: dict of file-level metadata, e.g., 'file_path' and 'uuid'
+        :inherited: shared metadata layer, from metadata_layer()
+        """
+        self._inherited = inherited
+        self._extra = None
+        for key, value in fields.items():
+            if key in _file_fields:
+                setattr(self, key,
+                        sys.intern(value) if key == 'media_type' else value)
+            else:
+                if self._extra is None:
+                    self._extra = {}
+                self._extra[sys.intern(key)] = value
+
+    def __repr__(self):
+        return f"CatalogRecord({self.to_dict()!r})"
+
+    def _own(self):
+        """Returns the file-level fields as a dict."""
+        own = {}
+        for key in file_fields:
+            try:
+                own[key] = getattr(self, key)
+            except AttributeError:
+                pass
+        if self._extra:
+            own.update(self._extra)
+        return own
+
+    def __getitem__(self, key):
+        if key in _file_fields:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        return self._inherited[key]
+
+    def __iter__(self):
+        yield from self._inherited
+        yield from (key for key in self._own() if key not in self._inherited)
+
+    def __len__(self):
+        return len(self._inherited) + sum(key not in self._inherited
+                for key in self._own())
+
+    def to_dict(self):
+        """Returns the record as a plain dict."""
+        return {**self._inherited, **self._own()}
+
+def catalog_format(path):
+    """Infers the format of a catalog file from its extension."""
+    for name, extension in catalog_formats.items():
+        if path.endswith(extension):
+            return name
+    raise ValueError(f"Unknown catalog format for '{path}', expected one of "\
+            + f"{list(catalog_formats.values())}")
+
+def matches(record, where):
+    """Whether a record satisfies every (column, operator, value) filter."""
+    for column, op, value in where:
+        field = record.get(column)
+        if field is None or not filter_operators[op](field, value):
+            return False
+    return True
+
+def _arrow_filter(where):
+    """Translates filters into a pyarrow.compute expression."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    expression = None
+    for column, op, value in where:
+        field = pc.field(column)
+        if op == 'startswith':
+            # String kernels do not take dictionary encoded columns as is.
+            condition = pc.starts_with(field.cast(pa.string()), value)
+        elif op == 'in':
+            condition = field.isin(value)
+        elif op == 'not in':
+            condition = ~field.isin(value) & field.is_valid()
+        else:
+            condition = filter_operators[op](field, value)
+        expression = condition if expression is None else expression & condition
+    return expression
+
+def records_table(records):
+    """
+    Builds a pyarrow.Table from flat records, with one column per key seen in
+    any record (in order of first appearance) and nulls where a key is
+    missing. String columns with many repeated values, such as inherited
+    archive, platform and document metadata, are dictionary encoded.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    records = [dict(record) for record in records]
+    columns = {}
+    for record in records:
+        columns.update(dict.fromkeys(record))
+    table = pa.table({column: [record.get(column) for record in records]
+        for column in columns})
+    for i, field in enumerate(table.schema):
+        if pa.types.is_string(field.type) and \
+                2*pc.count_distinct(table.column(i)).as_py() <= table.num_rows:
+            table = table.set_column(i, field.name,
+                    table.column(i).dictionary_encode())
+    return table
+
+def _arrow_type(column, values):
+    """Arrow type of a new Parquet column, inferred from its first values:
+    repetitive strings are dictionary encoded, and all-null columns are
+    taken to be strings."""
+    import pyarrow as pa
+    if column == 'file_size':
+        return pa.int64()
+    value_type = pa.array(values).type
+    if pa.types.is_null(value_type):
+        return pa.string()
+    if pa.types.is_string(value_type) and 2*len(set(values)) <= len(values):
+        return pa.dictionary(pa.int32(), pa.string())
+    return value_type
+
+def _write_parquet(catalog, path, row_group_size):
+    """
+    Writes records to a Parquet file one row group at a time, holding only
+    row_group_size records in memory. The schema is fixed by the first row
+    group. Should a later one bring new keys (e.g., from a tag file deeper
+    in the tree), the rest goes to a new part with the widened schema, and
+    the parts are merged row group by row group at the end.
+    """
+    import os
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    def chunks():
+        chunk = []
+        for record in catalog:
+            chunk.append(dict(record))
+            if len(chunk) == row_group_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    schema, writer, parts = pa.schema([]), None, []
+    try:
+        for chunk in chunks():
+            new = [k for k in dict.fromkeys(k for r in chunk for k in r)
+                    if k not in schema.names]
+            if new or writer is None:
+                if writer is not None:
+                    writer.close()
+                for column in new:
+                    schema = schema.append(pa.field(column,
+                        _arrow_type(column, [r.get(column) for r in chunk])))
+                parts.append(f'{path}.part{len(parts)}')
+                writer = pq.ParquetWriter(parts[-1], schema)
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema),
+                    row_group_size=row_group_size)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if len(parts) == 1:
+        os.replace(parts[0], path)
+        return
+    with pq.ParquetWriter(path, schema) as writer:
+        for part in parts:
+            part_file = pq.ParquetFile(part)
+            for i in range(part_file.num_row_groups):
+                table = part_file.read_row_group(i)
+                for field in schema:
+                    if field.name not in table.column_names:
+                        table = table.append_column(field,
+                                pa.nulls(table.num_rows, field.type))
+                writer.write_table(table, row_group_size=row_group_size)
+            os.remove(part)
+
+def write_catalog(catalog, path, format=None, row_group_size=2**16):
+    """
+    Writes a flat catalog to path. JSON Lines are written record by record,
+    and Parquet (requires pyarrow) one row group at a time, so catalog may
+    be a generator, e.g., from utils.iter_catalog().
+
+    :catalog: iterable of flat dictionaries
+    :format: 'json', 'jsonl' or 'parquet', by default from path's extension
+    :row_group_size: number of records per Parquet row group
+    :returns: path
+
+    """
+    format = format or catalog_format(path)
+    if format == 'json':
+        with open(path, 'w') as fp:
+            json.dump([dict(record) for record in catalog], fp, indent=4)
+    elif format == 'jsonl':
+        with open(path, 'w') as fp:
+            for record in catalog:
+                fp.write(json.dumps(dict(record)) + '\n')
+    elif format == 'parquet':
+        _write_parquet(catalog, path, row_group_size)
+    else:
+        raise ValueError(f"Unknown catalog format '{format}', expected one of {list(catalog_formats)}")
+    return path
+
+def read_catalog(path, columns=None, where=None, format=None, batch_size=2**16):
+    """
+    Yields the records of a catalog file that match every filter in where,
+    restricted to columns. JSON Lines are parsed one line at a time, and
+    Parquet (requires pyarrow) one batch of the selected columns at a time,
+    with filters pushed down to the reader. A plain JSON catalog has to be
+    loaded whole. Null values read from Parquet are left out of records.
+
+    :columns: (optional) list of keys to keep in each record
+    :where: (optional) list of (column, operator, value) filters, with
+    operators from filter_operators, e.g., [('media_type', 'startswith', 'image')]
+    :format: 'json', 'jsonl' or 'parquet', by default from path's extension
+    :returns: generator of flat dictionaries
+
+    """
+    format = format or catalog_format(path)
+    where = where or []
+    if format == 'parquet':
+        import pyarrow.dataset as ds
+        dataset = ds.dataset(path, format='parquet')
+        for batch in dataset.to_batches(columns=columns, batch_size=batch_size,
+                filter=_arrow_filter(where) if where else None):
+            for row in batch.to_pylist():
+                yield {k: v for k, v in row.items() if v is not None}
+        return
+
+    if format == 'json':
+        with open(path, 'r') as fp:
+            records = json.load(fp)
+    elif format == 'jsonl':
+        records = _iter_lines(path)
+    else:
+        raise ValueError(f"Unknown catalog format '{format}', expected one of {list(catalog_formats)}")
+    for record in records:
+        if matches(record, where):
+            yield record if columns is None else \
+                    {k: record[k] for k in columns if k in record}
+
+def _iter_lines(path):
+    with open(path, 'r') as fp:
+        for line in fp:
+            if line.strip():
+                yield json.loads(line)
+
+def read_catalog_table(path, columns=None, where=None, format=None):
+    """
+    Reads the matching records of a catalog file into a pyarrow.Table, e.g.,
+    for table.to_pandas(). Parquet is read column by column, other formats
+    through read_catalog().
+    """
+    format = format or catalog_format(path)
+    if format == 'parquet':
+        import pyarrow.dataset as ds
+        return ds.dataset(path, format='parquet').to_table(columns=columns,
+                filter=_arrow_filter(where) if where else None)
+    return records_table(read_catalog(path, columns, where, format))
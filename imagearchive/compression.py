@@ -0,0 +1,114 @@
+#! /usr/bin/env python3
+#
+# 2026-10-16
+# CC-0 Public Domain
+
+"""
+Parallel block compression for tar archives
+"""
+
+import gzip
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Files that are already compressed gain nothing from another pass.
+precompressed_extensions = {
+        '.jpg', '.jpeg', '.jpe', '.jif', '.jfif', '.jfi',
+        '.jp2', '.j2k', '.jpf', '.jpx', '.jpm', '.mj2',
+        '.png', '.gif', '.webp', '.gz', '.bz2', '.xz', '.zst', '.zip',
+        }
+
+codec_extensions = {'gzip': '.gz', 'zstd': '.zst'}
+
+def compress_block(data, level, codec='gzip'):
+    """
+    Compresses data into one self-contained gzip member (or zstd frame).
+    Members and frames can be concatenated into a valid stream. Level 0
+    stores the data uncompressed; zstd has no stored mode, so level 0 falls
+    back to its fastest standard level there.
+    """
+    if codec == 'gzip':
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor(level=max(level, 1)).compress(data)
+    raise ValueError(f"Unknown codec '{codec}', expected one of {list(codec_extensions)}")
+
+class ParallelCompressor:
+
+    """Write-only file object that compresses blocks on a thread pool.
+
+    Written bytes are cut into blocks of block_size, each compressed
+    independently (zlib and zstd release the GIL) and written to fileobj in
+    order, as a multi-member gzip stream or a multi-frame zstd stream. At
+    most 2*workers blocks are in flight at a time.
+    """
+
+    def __init__(self, fileobj, level=6, workers=4, block_size=4*2**20,
+            codec='gzip'):
+        """
+        :fileobj: binary file object to write the compressed stream to
+        :level: compression level of subsequent blocks, see set_level()
+        :workers: number of compression threads
+        :block_size: number of uncompressed bytes per block
+        :codec: 'gzip' or 'zstd'
+        """
+        if codec not in codec_extensions:
+            raise ValueError(f"Unknown codec '{codec}', expected one of {list(codec_extensions)}")
+        self.fileobj = fileobj
+        self.level = level
+        self.workers = workers
+        self.block_size = block_size
+        self.codec = codec
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._buffer = bytearray()
+        self._pending = deque()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _submit(self, block):
+        self._pending.append(self._pool.submit(
+            compress_block, bytes(block), self.level, self.codec))
+        while len(self._pending) > 2*self.workers:
+            self._drain_one()
+
+    def _drain_one(self):
+        compressed = self._pending.popleft().result()
+        self.fileobj.write(compressed)
+        self.bytes_out += len(compressed)
+
+    def write(self, data):
+        self._buffer += data
+        self.bytes_in += len(data)
+        while len(self._buffer) >= self.block_size:
+            self._submit(self._buffer[:self.block_size])
+            del self._buffer[:self.block_size]
+        return len(data)
+
+    def flush(self):
+        """Ends the current block early, so later writes start a new one."""
+        if self._buffer:
+            self._submit(self._buffer)
+            self._buffer = bytearray()
+
+    def set_level(self, level):
+        """Compresses subsequent writes at level (0 to store them as-is)."""
+        if level != self.level:
+            self.flush()
+            self.level = level
+
+    def close(self):
+        """Compresses what remains and waits for all blocks to be written."""
+        if self._pool is None:
+            return
+        self.flush()
+        while self._pending:
+            self._drain_one()
+        self._pool.shutdown()
+        self._pool = None
@@ -8,10 +8,9 @@
 Configuration structure
 """
 
+import os
 import configparser
 
-from sqlalchemy import create_engine
-
 from .directories import IngestDirectory, DataDirectory, OutputDirectory
 
 def configure(config_file='../docs/default_config.ini'):
@@ -29,40 +28,104 @@ def configure(config_file='../docs/default_config.ini'):
 
     2. A [database] section that gives info to create a SQLAlchemy database URL.
 
+    The parsed configuration is cached per file and only re-read when the
+    file's modification time changes, so treat it as read-only.
+
     :config_file: path to configuration file
     :returns: configparser.ConfigParser() instance
 
     """
+    path = os.path.abspath(config_file)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    cached = _configurations.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
 
     configuration = configparser.ConfigParser()
     configuration.read(config_file)
+    _configurations[path] = (mtime, configuration)
     return configuration
 
+# config file path -> (mtime, configparser.ConfigParser() instance)
+_configurations = {}
+
+# database URL -> sqlalchemy.Engine() instance, shared process-wide
+_engines = {}
+
+# PRAGMAs set on every new SQLite connection from 'sqlite_<pragma>' options
+sqlite_pragmas = ('journal_mode', 'synchronous', 'cache_size', 'mmap_size')
+
+def database_url(params):
+    """
+    Returns the SQLAlchemy database URL for a [database] section.
+
+    :params: configparser.SectionProxy() for the [database] section
+    """
+    if params.getboolean('sqlite'):
+        return f'sqlite:///{params.get("sqlite_path", ":memory:") or ":memory:"}'
+    return (f'{params["dialect"]}'
+            + f'+{params["driver"]}'
+            + f'://{params["username"]}'
+            + f':{params["password"]}'
+            + f'@{params["host"]}'
+            + (f':{params["port"]}/' if params["port"] else '/')
+            + f'{params["database"]}')
+
 def setup_database_engine(config_file='../docs/default_config.ini'):
     """
     Wrapper around sqlalchemy.create_engine() that obtains a database URL
     from the specified config_file.
 
+    Engines are kept in a process-wide registry keyed by URL, so repeated
+    calls share one connection pool. Pool settings (pool_size, max_overflow,
+    pool_recycle, pool_pre_ping) and, for SQLite, sqlite_path and the
+    sqlite_* PRAGMAs (see sqlite_pragmas) are read from the [database]
+    section.
+
     :config_file: path to configuration file
     :returns: sqlalchemy.Engine() instance
 
     """
-
-    conf = configure(config_file)
-    if conf['database'].getboolean('sqlite'):
-        engine = create_engine('sqlite:///:memory:')
+    params = configure(config_file)['database']
+    url = database_url(params)
+    if url in _engines:
+        return _engines[url]
+
+    # Imported here, so directory-only callers never pay for SQLAlchemy.
+    from sqlalchemy import create_engine, event
+
+    options = {'pool_pre_ping': params.getboolean('pool_pre_ping', fallback=False)}
+    if params.get('pool_recycle'):
+        options['pool_recycle'] = params.getint('pool_recycle')
+    if params.getboolean('sqlite'):
+        engine = create_engine(url, **options)
+        pragmas = {pragma: params[f'sqlite_{pragma}'] for pragma in sqlite_pragmas
+                if params.get(f'sqlite_{pragma}')}
+        if pragmas:
+            @event.listens_for(engine, 'connect')
+            def set_pragmas(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                for pragma, value in pragmas.items():
+                    cursor.execute(f'PRAGMA {pragma}={value}')
+                cursor.close()
     else:
-        params = conf['database']
-        engine = create_engine(
-                    f'{params["dialect"]}'
-                    + f'+{params["driver"]}'
-                    + f'://{params["username"]}'
-                    + f':{params["password"]}'
-                    + f'@{params["host"]}'
-                    + (f':{params["port"]}/' if params["port"] else '/')
-                    + f'{params["database"]}'
-                    )
-    return engine
+        for option in ['pool_size', 'max_overflow']:
+            if params.get(option):
+                options[option] = params.getint(option)
+        engine = create_engine(url, **options)
+    return _engines.setdefault(url, engine)
+
+def dispose_engines():
+    """
+    Closes the connection pools of all registered engines and empties the
+    registry, e.g., in a worker process after a fork.
+    """
+    for engine in _engines.values():
+        engine.dispose()
+    _engines.clear()
 
 ##
 
@@ -78,5 +141,7 @@ def setup_directories(config_file='../docs/default_config.ini'):
     """
     params = configure(config_file)['directories']
     return (IngestDirectory(abspath=params['ingest_dir']),
-            DataDirectory(abspath=params['data_dir']),
+            DataDirectory(abspath=params['data_dir'],
+                shard_depth=params.getint('data_shard_depth', fallback=0),
+                shard_width=params.getint('data_shard_width', fallback=2)),
             OutputDirectory(abspath=params['output_dir']))
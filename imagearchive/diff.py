@@ -0,0 +1,158 @@
+#! /usr/bin/env python3
+#
+# 2026-10-16
+# CC-0 Public Domain
+
+"""
+Differences between flat catalogs, as inserts, updates and deletes
+"""
+
+import os
+import heapq
+import tempfile
+
+from .catalog import record_key, read_catalog, write_catalog
+
+class CatalogDiff:
+
+    """Changes that turn an old flat catalog into a new one
+
+    :inserts: records only in the new catalog
+    :updates: records of the new catalog that differ from their old match
+    :deletes: records only in the old catalog
+    :unchanged: number of records equal in both
+
+    Iterating yields ('insert' | 'update' | 'delete', record) pairs, as
+    diff_sorted() does, e.g., for loader.apply_diff().
+    """
+
+    def __init__(self):
+        self.inserts = []
+        self.updates = []
+        self.deletes = []
+        self.unchanged = 0
+
+    def __repr__(self):
+        return f"CatalogDiff(inserts={len(self.inserts)}, "\
+                + f"updates={len(self.updates)}, deletes={len(self.deletes)}, "\
+                + f"unchanged={self.unchanged})"
+
+    def __len__(self):
+        return len(self.inserts) + len(self.updates) + len(self.deletes)
+
+    def __iter__(self):
+        for operation, records in [('insert', self.inserts),
+                ('update', self.updates), ('delete', self.deletes)]:
+            for record in records:
+                yield operation, record
+
+def _differs(old, new, fields):
+    """Whether two matched records differ, in every key or only in fields."""
+    if fields is None:
+        return old != new
+    return any(old.get(field) != new.get(field) for field in fields)
+
+def diff_catalogs(old, new, fields=None):
+    """
+    Compares two flat catalogs in memory, with a hash join on uuid. A record
+    without a uuid on either side (e.g., a file cataloged before it was
+    assigned one, or a tag file) is matched by 'file_path' instead.
+
+    :old: iterable of flat dictionaries, e.g., from read_timestamped_catalog()
+    :new: iterable of flat dictionaries, e.g., from unnormalize_catalog()
+    :fields: (optional) keys to compare, by default all of them
+    :returns: CatalogDiff
+
+    """
+    old = list(old)
+    by_uuid, by_path = {}, {}
+    for i, record in enumerate(old):
+        if record.get('uuid') is not None:
+            by_uuid[record['uuid']] = i
+        if record.get('file_path') is not None:
+            by_path[record['file_path']] = i
+    matched = bytearray(len(old))
+
+    diff = CatalogDiff()
+    for record in new:
+        i = by_uuid.get(record.get('uuid'))
+        if i is None:
+            i = by_path.get(record.get('file_path'))
+            if i is not None and (matched[i] or (record.get('uuid') is not None
+                    and old[i].get('uuid') is not None)):
+                # Both have uuids, and they differ: a different image.
+                i = None
+        if i is None:
+            diff.inserts.append(record)
+            continue
+        matched[i] = 1
+        if _differs(old[i], record, fields):
+            diff.updates.append(record)
+        else:
+            diff.unchanged += 1
+    diff.deletes = [record for i, record in enumerate(old) if not matched[i]]
+    return diff
+
+def diff_sorted(old, new, key=record_key, fields=None):
+    """
+    Compares two flat catalogs that are both sorted by key (e.g., by
+    sort_catalog()), in one merge pass holding a single record of each, so
+    catalogs of any size can be compared. Records are matched by key only,
+    without the file_path fallback of diff_catalogs().
+
+    :old: iterable of flat dictionaries, sorted by key
+    :new: iterable of flat dictionaries, sorted by key
+    :key: sort key of records, by default catalog.record_key()
+    :fields: (optional) keys to compare, by default all of them
+    :yields: ('insert' | 'update' | 'delete', record) pairs
+
+    """
+    old, new = iter(old), iter(new)
+    a, b = next(old, None), next(new, None)
+    key_a = None if a is None else key(a)
+    key_b = None if b is None else key(b)
+    while a is not None or b is not None:
+        if b is None or (a is not None and key_a < key_b):
+            yield 'delete', a
+            a = next(old, None)
+            key_a = None if a is None else key(a)
+        elif a is None or key_b < key_a:
+            yield 'insert', b
+            b = next(new, None)
+            key_b = None if b is None else key(b)
+        else:
+            if _differs(a, b, fields):
+                yield 'update', b
+            a, b = next(old, None), next(new, None)
+            key_a = None if a is None else key(a)
+            key_b = None if b is None else key(b)
+
+def sort_catalog(catalog, key=record_key, chunk_size=500000, tmp_dir=None):
+    """
+    Yields the records of a flat catalog sorted by key, holding at most
+    chunk_size records in memory: sorted runs are spilled to temporary JSON
+    Lines files, which are then merged.
+
+    :catalog: iterable of flat dictionaries
+    :key: sort key of records, by default catalog.record_key()
+    :tmp_dir: (optional) directory for the temporary runs
+    :yields: flat dictionaries
+
+    """
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        runs, chunk = [], []
+        for record in catalog:
+            chunk.append(dict(record))
+            if len(chunk) == chunk_size:
+                runs.append(write_catalog(sorted(chunk, key=key),
+                    os.path.join(tmp, f'run{len(runs):05}.jsonl'), 'jsonl'))
+                chunk = []
+        if not runs:
+            yield from sorted(chunk, key=key)
+            return
+        if chunk:
+            runs.append(write_catalog(sorted(chunk, key=key),
+                os.path.join(tmp, f'run{len(runs):05}.jsonl'), 'jsonl'))
+            chunk = []
+        yield from heapq.merge(*[read_catalog(run, format='jsonl') for run in runs],
+                key=key)
@@ -14,7 +14,9 @@ import tarfile
 from datetime import datetime
 from pathlib import Path
 from os.path import expandvars
-from distutils.dir_util import copy_tree
+
+from .compression import ParallelCompressor, codec_extensions, precompressed_extensions
+from .transfer import copy_file, copy_tree, remove_path, run_parallel
 
 class Directory:
 
@@ -33,50 +35,71 @@ class Directory:
         return f"Directory(abspath='{self.abspath}')"
 
     @staticmethod
-    def remove_content(absolute_path):
-        try:
-            for filename in os.listdir(absolute_path):
-                file_path = os.path.join(absolute_path, filename)
-                try:
-                    if os.path.isfile(file_path) or os.path.islink(file_path):
-                        os.unlink(file_path)
-                    elif os.path.isdir(file_path):
-                        shutil.rmtree(file_path)
-                except Exception as e:
-                    print(f'Failed to delete {file_path}. Reason: {e}')
-        except NotADirectoryError as e:
-            os.unlink(absolute_path)
-
-    def empty_some(self, content=[]):
+    def _removal_targets(absolute_path):
+        """Yields the children of a directory, or else the path itself."""
+        if os.path.isdir(absolute_path) and not os.path.islink(absolute_path):
+            with os.scandir(absolute_path) as it:
+                for entry in it:
+                    yield entry.path
+        else:
+            yield absolute_path
+
+    @staticmethod
+    def remove_content(absolute_path, workers=8):
+        """
+        Removes everything in the directory at 'absolute_path' (or the file
+        at 'absolute_path') on a pool of threads.
+
+        :workers: number of threads
+        :returns: transfer.TransferResult, listing failures with exceptions
+        """
+        return run_parallel(remove_path,
+                Directory._removal_targets(absolute_path), workers=workers)
+
+    def empty_some(self, content=[], workers=8):
         """
         Empties specified content from the Directory.
 
         :content: Defaults to an empty list, in which case nothing in the
         Directory is removed. If 'content' is an iterator of relative paths to the
         Directory's root, these paths only are removed.
+        :workers: number of threads
+        :returns: transfer.TransferResult, listing failures with exceptions
         """
         try:
-            for relative_path in content:
-                self.remove_content(os.path.join(self.abspath, relative_path))
+            iter(content)
         except TypeError:
             raise ValueError(f'Argument {content} is not iterable')
+        targets = (target for relative_path in content
+                for target in self._removal_targets(
+                    os.path.join(self.abspath, relative_path)))
+        return run_parallel(remove_path, targets, workers=workers)
+
+    def empty_all(self, workers=8):
+        """Empties all content from the Directory.
 
-    def empty_all(self):
-        """Empties all content from the Directory."""
+        :returns: transfer.TransferResult
+        """
         print(f'Removing all content under {self.abspath} ...')
-        self.remove_content(self.abspath)
+        return self.remove_content(self.abspath, workers=workers)
 
-    def fetch_all_from(self, src_directory):
+    def fetch_all_from(self, src_directory, strategy=None, workers=8):
         """
         Copies all content from 'src_directory' instance to the Directory.
-        This is a wrapper method for distutils.dir_util.copy_tree
+        This is a wrapper method for transfer.copy_tree
 
         :src_directory: Directory instance to copy content from
+        :strategy: (optional) copy strategy, or sequence of strategies in
+        order of preference, see transfer.copy_file
+        :workers: number of threads
+        :returns: transfer.TransferResult, with (relative path, copy strategy
+        used) successes
 
         """
-        copy_tree(src_directory.abspath, self.abspath)
+        return copy_tree(src_directory.abspath, self.abspath, strategy,
+                workers=workers)
 
-    def fetch_some_from(self, src_directory, content=[]):
+    def fetch_some_from(self, src_directory, content=[], strategy=None, workers=8):
         """
         Copies specified content from 'src_directory' instance to the Directory.
 
@@ -84,35 +107,78 @@ class Directory:
         :content: Defaults to an empty list, in which case nothing happens. 
         If 'content' is an iterator of relative paths from the src_directory's
         root, these paths only are copied.
+        :strategy: (optional) copy strategy, or sequence of strategies in
+        order of preference, see transfer.copy_file
+        :workers: number of threads
+        :returns: transfer.TransferResult, with (relative path, copy strategy
+        used) successes
         """
         try:
-            for relative_path in content:
-                shutil.copy(os.path.join(src_directory.abspath, relative_path),
-                        self.abspath)
+            iter(content)
         except TypeError:
             raise ValueError(f'Argument {content} is not iterable')
 
-    def create_tar_archive(self, outdir=None):
+        def fetch(relative_path):
+            dst, strategy_used = copy_file(
+                    os.path.join(src_directory.abspath, relative_path),
+                    self.abspath, strategy)
+            return strategy_used, os.path.getsize(dst)
+
+        return run_parallel(fetch, content, workers=workers)
+
+    def create_tar_archive(self, outdir=None, workers=None, level=6, codec='gzip'):
         """Creates a gzipped tar archive of the Directory's contents, in the
         Directory itself, unless 'outdir' is specified. I recommend leaving
         outdir as None. In good OO-design, objects should be responsible for
         mutating themselves.
 
         :outdir: (optional) a Directory instance, not recommended
+        :workers: (optional) number of threads to compress with. If given,
+        the archive is written as a multi-member gzip (or multi-frame zstd)
+        stream, and already-compressed files (JPEG, JPEG 2000, ...) are stored
+        without recompression.
+        :level: compression level
+        :codec: 'gzip', or 'zstd' (requires workers and the zstandard package)
         :returns: path to gzipped tar archive
 
         """
         # for the tar archive filename, we need a timestamp 
         timestamp = datetime.now().strftime('%F-%H%M%S') # e.g., '2020-04-21-132052'
         directory_basename = os.path.basename(self.abspath)
-        tar_archive_name = f"{timestamp}-{directory_basename}.tar.gz"
+        tar_archive_name = f"{timestamp}-{directory_basename}.tar"\
+                + codec_extensions[codec]
         try:
             tar_archive_abspath = os.path.join(outdir.abspath, tar_archive_name)
         except AttributeError:
             tar_archive_abspath = os.path.join(self.abspath, tar_archive_name)
-        with tarfile.open(tar_archive_abspath, mode="w:gz") as tar:
+        if workers is None:
+            if codec != 'gzip':
+                raise ValueError(f"Codec '{codec}' requires 'workers' to be set")
+            with tarfile.open(tar_archive_abspath, mode="w:gz",
+                    compresslevel=level) as tar:
+                print(f"Creating tar archive {tar_archive_abspath} ...")
+                tar.add(self.abspath, arcname=f"{timestamp}-{directory_basename}")
+            return tar_archive_abspath
+
+        with open(tar_archive_abspath, 'wb') as fp, \
+                ParallelCompressor(fp, level=level, workers=workers,
+                        codec=codec) as compressor, \
+                tarfile.open(fileobj=compressor, mode="w|") as tar:
             print(f"Creating tar archive {tar_archive_abspath} ...")
-            tar.add(self.abspath, arcname=f"{timestamp}-{directory_basename}")
+            for root, dirs, files in os.walk(self.abspath):
+                dirs.sort()
+                arcroot = os.path.normpath(os.path.join(
+                    f"{timestamp}-{directory_basename}",
+                    os.path.relpath(root, self.abspath)))
+                tar.add(root, arcname=arcroot, recursive=False)
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    if path == tar_archive_abspath:
+                        continue
+                    _, ext = os.path.splitext(name)
+                    compressor.set_level(
+                            0 if ext.lower() in precompressed_extensions else level)
+                    tar.add(path, arcname=os.path.join(arcroot, name))
         return tar_archive_abspath
 
     def remove_tar_archive(self):
@@ -120,7 +186,7 @@ class Directory:
         Removes any gzipped tar archives contained in the Directory, if they exist.
         """
         for item in os.listdir(self.abspath):
-            if item.endswith(".tar.gz"):
+            if item.endswith((".tar.gz", ".tar.zst")):
                 tar_archive_abspath = os.path.join(self.abspath, item)
                 print(f"Removing tar archive {tar_archive_abspath} ...")
                 os.remove(tar_archive_abspath)
@@ -139,10 +205,159 @@ class IngestDirectory(Directory):
 
 class DataDirectory(Directory):
 
-    """Images are to be output from an DataDirectory"""
+    """Images are to be output from an DataDirectory
 
-    def __init__(self, **kwargs):
+    Image files are named by uuid. With shard_depth > 0 they are stored in a
+    content-addressed tree, e.g., with shard_depth=2 and shard_width=2,
+    uuid '0e7fa3c2...' lives at '0e/7f/0e7fa3c2...', which keeps directories
+    small. The leading hex digits of a uuid1 come from the low 32 bits of its
+    timestamp, which wrap every seven minutes, so shards fill evenly over
+    an ingest.
+    """
+
+    def __init__(self, *, shard_depth=0, shard_width=2, **kwargs):
+        """
+        :shard_depth: number of directory levels above each image file
+        :shard_width: number of uuid characters naming each level
+        """
         super().__init__(**kwargs)
+        self.shard_depth = shard_depth
+        self.shard_width = shard_width
+
+    def __repr__(self):
+        return f"DataDirectory(abspath='{self.abspath}', "\
+                + f"shard_depth={self.shard_depth}, shard_width={self.shard_width})"
+
+    def _shards(self, uuid, shard_depth, shard_width):
+        if len(uuid) < shard_depth * shard_width:
+            raise ValueError(f"'{uuid}' is too short to shard")
+        return [uuid[i*shard_width:(i+1)*shard_width] for i in range(shard_depth)]
+
+    def path_for(self, uuid):
+        """Returns the absolute path to the image file named uuid."""
+        return os.path.join(self.abspath,
+                *self._shards(uuid, self.shard_depth, self.shard_width), uuid)
+
+    def exists(self, uuid):
+        """Tests whether the image file named uuid is in the DataDirectory."""
+        return os.path.isfile(self.path_for(uuid))
+
+    def put(self, uuid, src, move=False):
+        """
+        Stores the file at path src as the image file named uuid.
+
+        :move: if True, rename src into place rather than copy it
+        :returns: absolute path to the stored file
+        """
+        dst = self.path_for(uuid)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        if move:
+            shutil.move(src, dst)
+        else:
+            shutil.copy2(src, dst)
+        return dst
+
+    def _iter_layout(self, shard_depth, shard_width):
+        """Yields (uuid, path) for image files stored in the given layout."""
+        def scan(path, depth):
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.name.startswith('.'):
+                        continue
+                    if depth < shard_depth:
+                        if entry.is_dir(follow_symlinks=False) \
+                                and len(entry.name) == shard_width:
+                            yield from scan(entry.path, depth + 1)
+                    elif entry.is_file(follow_symlinks=False) \
+                            and not entry.name.endswith((".tar.gz", ".tar.zst")):
+                        yield entry.name, entry.path
+        yield from scan(self.abspath, 0)
+
+    def __iter__(self):
+        """Iterates over the uuids of image files in the DataDirectory."""
+        for uuid, _ in self._iter_layout(self.shard_depth, self.shard_width):
+            yield uuid
+
+    def reshard(self, from_depth=0, from_width=None):
+        """
+        Migrates image files stored in another layout (by default, flat) into
+        this DataDirectory's layout, in place, using renames only. Emptied
+        shard directories of the old layout are removed.
+
+        :from_depth: shard_depth of the existing layout
+        :from_width: shard_width of the existing layout, by default the same
+        :returns: number of files moved
+        """
+        from_width = self.shard_width if from_width is None else from_width
+        moved = 0
+        # Collect first: renames would otherwise disturb the directory scan.
+        for uuid, src in list(self._iter_layout(from_depth, from_width)):
+            dst = self.path_for(uuid)
+            if src == dst:
+                continue
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            os.rename(src, dst)
+            moved += 1
+        if from_depth:
+            for root, dirs, files in os.walk(self.abspath, topdown=False):
+                if root != self.abspath and not os.listdir(root):
+                    os.rmdir(root)
+        return moved
+
+    @staticmethod
+    def _image_fields(image):
+        """Returns (uuid, original name or None) for a uuid, an Image or a row."""
+        if isinstance(image, str):
+            return image, None
+        try:
+            return image.id, getattr(image, 'file_original_name', None)
+        except AttributeError:
+            return image['id'], image.get('file_original_name')
+
+    def export_tar(self, images, fileobj, arcdir='', rename=False, codec=None,
+            level=6, workers=1):
+        """
+        Streams a tar archive of images straight from the DataDirectory to
+        fileobj, one member at a time, without staging copies in an
+        OutputDirectory.
+
+        :images: iterable of uuids, Image instances, or query result rows
+        with an 'id' (and optionally a 'file_original_name') column
+        :fileobj: path to write to, or any writable binary file object
+        (e.g., a pipe, socket file or sys.stdout.buffer)
+        :arcdir: (optional) directory name to put members under in the archive
+        :rename: if True, name members by their file_original_name, when
+        known. Original names repeat across documents (e.g., 'page0001.jpg'),
+        so a name already in the archive is prefixed with the uuid.
+        :codec: None for a plain tar stream, else 'gzip' or 'zstd'
+        :level: compression level
+        :workers: number of compression threads
+        :returns: number of images written
+
+        """
+        if isinstance(fileobj, (str, os.PathLike)):
+            with open(fileobj, 'wb') as fp:
+                return self.export_tar(images, fp, arcdir=arcdir, rename=rename,
+                        codec=codec, level=level, workers=workers)
+        if codec is not None:
+            with ParallelCompressor(fileobj, level=level, workers=workers,
+                    codec=codec) as compressor:
+                return self.export_tar(images, compressor, arcdir=arcdir,
+                        rename=rename, level=level)
+
+        count = 0
+        names = set()
+        with tarfile.open(fileobj=fileobj, mode="w|") as tar:
+            for image in images:
+                uuid, original_name = self._image_fields(image)
+                name = original_name if (rename and original_name) else uuid
+                if rename:
+                    if name in names:
+                        name = f'{uuid}_{original_name}'
+                    names.add(name)
+                tar.add(self.path_for(uuid), arcname=os.path.join(arcdir, name))
+                count += 1
+        return count
 
 class OutputDirectory(Directory):
 
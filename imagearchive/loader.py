@@ -0,0 +1,518 @@
+#! /usr/bin/env python3
+#
+# 2026-10-16
+# CC-0 Public Domain
+
+"""
+Bulk loading of flat catalogs into the database
+"""
+
+import os
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from sqlalchemy import inspect, select, tuple_, Date, DateTime
+
+from .diff import diff_sorted, sort_catalog
+from .schema import Archive, Platform, Document, Image, uuid_to_bin
+
+# Natural keys identify a row independently of its surrogate 'id'.
+natural_keys = {
+        Archive.__table__: ('name', 'country_code'),
+        Platform.__table__: ('name', 'country_code'),
+        Document.__table__: ('id_within_archive', 'id_within_archive_type'),
+        Image.__table__: ('id',),
+        }
+
+def _coerce(table, row):
+    """Parses ISO format strings for Date and DateTime columns of table."""
+    for key, value in row.items():
+        if isinstance(value, str):
+            column_type = table.c[key].type
+            if isinstance(column_type, DateTime):
+                row[key] = datetime.fromisoformat(value) if value else None
+            elif isinstance(column_type, Date):
+                row[key] = date.fromisoformat(value) if value else None
+    return row
+
+def _prefixed(record, prefix, table):
+    """Collects 'prefix.column' keys of a flat catalog record into a row."""
+    row = {key[len(prefix)+1:]: value for key, value in record.items()
+            if key.startswith(prefix + '.') and key[len(prefix)+1:] in table.c}
+    return _coerce(table, row)
+
+def natural_key(table, row):
+    """
+    Returns the natural key of row, or None if it is entirely missing.
+    Missing parts of a partial key are set to '' in row, as NULLs never
+    match in a unique index (see migrations.migrate_natural_keys).
+    """
+    key = tuple(row.get(column) for column in natural_keys[table])
+    if all(k is None for k in key):
+        return None
+    for column, k in zip(natural_keys[table], key):
+        if k is None:
+            row[column] = ''
+    return tuple('' if k is None else k for k in key)
+
+def rows_from_catalog(catalog):
+    """
+    Splits the image records of a flat catalog (as from unnormalize_catalog()
+    or iter_catalog()) into unique archive, platform, document and image rows,
+    keyed by natural key. Foreign keys are left as the natural keys of the
+    parent rows, under '_archive', '_platform' and '_document'.
+
+    :catalog: iterable of flat dictionaries
+    :returns: dict mapping each Table to a dict of natural key -> row
+
+    """
+    archive, platform = Archive.__table__, Platform.__table__
+    document, image = Document.__table__, Image.__table__
+    rows = {archive: {}, platform: {}, document: {}, image: {}}
+    for record in catalog:
+        if not record.get('media_type', '').startswith('image') \
+                or record.get('uuid') is None:
+            continue
+
+        arc_row = _prefixed(record, 'archive', archive)
+        arc_key = natural_key(archive, arc_row)
+        if arc_key is not None:
+            rows[archive].setdefault(arc_key, arc_row)
+
+        plt_row = _prefixed(record, 'platform', platform)
+        plt_key = natural_key(platform, plt_row)
+        if plt_key is not None:
+            rows[platform].setdefault(plt_key, plt_row)
+
+        doc_row = _prefixed(record, 'document', document)
+        doc_key = natural_key(document, doc_row)
+        if doc_key is not None:
+            doc_row['_archive'] = arc_key
+            doc_row['_platform'] = plt_key
+            rows[document].setdefault(doc_key, doc_row)
+
+        img_row = _coerce(image, {
+            'id': record['uuid'],
+            'file_media_type': record['media_type'],
+            'file_original_name': os.path.basename(record['file_path']),
+            **{k: record[k] for k in ['file_size', 'file_created_datetime',
+                'file_modified_datetime'] if k in record},
+            **({'file_checksum': record['checksum']} if 'checksum' in record else {})})
+        img_row['_document'] = doc_key
+        rows[image][(record['uuid'],)] = img_row
+    return rows
+
+class ChecksumIndex:
+
+    """Mapping of content checksums to the uuids of images already archived
+
+    Pass as 'duplicates' to utils.get_normalized_catalog() or iter_catalog()
+    to skip re-sent images before they are assigned uuids or copied into the
+    DataDirectory. Each unseen checksum costs one indexed lookup on
+    Image.file_checksum; checksums of newly cataloged images are added with
+    item assignment.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._uuids = {}
+
+    def __repr__(self):
+        return f"ChecksumIndex(engine={self.engine!r}, cached={len(self._uuids)})"
+
+    def get(self, checksum, default=None):
+        if checksum not in self._uuids:
+            image = Image.__table__
+            with self.engine.connect() as connection:
+                self._uuids[checksum] = connection.execute(
+                        select([image.c.id])
+                        .where(image.c.file_checksum == checksum)
+                        .limit(1)).scalar()
+        uuid = self._uuids[checksum]
+        return default if uuid is None else uuid
+
+    def __getitem__(self, checksum):
+        uuid = self.get(checksum)
+        if uuid is None:
+            raise KeyError(checksum)
+        return uuid
+
+    def __contains__(self, checksum):
+        return self.get(checksum) is not None
+
+    def __setitem__(self, checksum, uuid):
+        self._uuids[checksum] = uuid
+
+def get_id_map(connection, table, keys=None, batch_size=1000):
+    """
+    Maps natural keys to ids: for every row of table, in a single query, or
+    only for the given keys, batch_size keys per query (an IN on the key
+    column, or on a row value for composite keys). Keys without a row are
+    left out.
+    """
+    key_columns = [table.c[column] for column in natural_keys[table]]
+    s = select([table.c.id] + key_columns)
+    if keys is None:
+        return {tuple(row[1:]): row[0] for row in connection.execute(s)}
+    keys = list(keys)
+    id_map = {}
+    for i in range(0, len(keys), batch_size):
+        batch = keys[i:i+batch_size]
+        if len(key_columns) == 1:
+            condition = key_columns[0].in_([key[0] for key in batch])
+        else:
+            condition = tuple_(*key_columns).in_(batch)
+        for row in connection.execute(s.where(condition)):
+            id_map[tuple(row[1:])] = row[0]
+    return id_map
+
+def insert_missing(connection, table, rows, batch_size=1000, with_ids=True):
+    """
+    Inserts rows whose natural keys are not yet in table, batch_size rows per
+    executemany() call. Only the keys of rows are looked up, so inserting a
+    batch costs the same however large table already is.
+
+    :rows: dict of natural key -> row
+    :with_ids: if False, skip re-reading the id map and return None for it
+    :returns: (number of rows inserted, natural key -> id map of rows)
+
+    """
+    id_map = get_id_map(connection, table, rows, batch_size)
+    missing = [row for key, row in rows.items() if key not in id_map]
+    # executemany() needs the same columns in every row of a batch, so group
+    # rows by their columns rather than filling gaps over column defaults.
+    by_columns = {}
+    for row in missing:
+        by_columns.setdefault(tuple(sorted(row)), []).append(row)
+    for group in by_columns.values():
+        for i in range(0, len(group), batch_size):
+            connection.execute(table.insert(), group[i:i+batch_size])
+    if missing and with_ids:
+        id_map.update(get_id_map(connection, table,
+            [key for key in rows if key not in id_map], batch_size))
+    return len(missing), id_map if with_ids else None
+
+def upsert_statement(connection, table, columns):
+    """
+    Returns an INSERT into table which, for rows whose natural key already
+    exists, updates 'columns' instead (MySQL 'ON DUPLICATE KEY UPDATE',
+    SQLite and PostgreSQL 'ON CONFLICT'). Returns None for other dialects.
+
+    :columns: names of the non-key columns to update
+    """
+    dialect = connection.dialect.name
+    key_columns = natural_keys[table]
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table)
+        # A no-op assignment of the key keeps 'ON DUPLICATE KEY' valid.
+        return stmt.on_duplicate_key_update({column: stmt.inserted[column]
+            for column in (columns or key_columns[:1])})
+    if dialect in ['sqlite', 'postgresql']:
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table)
+        if not columns:
+            return stmt.on_conflict_do_nothing(index_elements=key_columns)
+        return stmt.on_conflict_do_update(index_elements=key_columns,
+                set_={column: stmt.excluded[column] for column in columns})
+    return None
+
+def upsert_rows(connection, table, rows, batch_size=1000, with_ids=True):
+    """
+    Inserts rows into table, updating rows whose natural key already exists,
+    batch_size rows per executemany() call. Falls back to insert_missing()
+    for dialects without an upsert.
+
+    :rows: dict of natural key -> row
+    :with_ids: if False, skip reading the id map and return None for it
+    :returns: (number of rows written, natural key -> id map of rows)
+
+    """
+    by_columns = {}
+    for row in rows.values():
+        by_columns.setdefault(tuple(sorted(row)), []).append(row)
+    for columns, group in by_columns.items():
+        stmt = upsert_statement(connection, table,
+                [c for c in columns if c not in natural_keys[table]])
+        if stmt is None:
+            return insert_missing(connection, table, rows, batch_size, with_ids)
+        for i in range(0, len(group), batch_size):
+            connection.execute(stmt, group[i:i+batch_size])
+    return len(rows), get_id_map(connection, table, rows, batch_size) \
+            if with_ids else None
+
+def load_catalog(engine, catalog, batch_size=1000, upsert=True, id_maps=None):
+    """
+    Loads the images of a flat catalog, along with their archives, platforms
+    and documents, in one transaction. Rows already present (by natural key)
+    are updated, or with upsert=False left as they are, so a catalog can be
+    loaded more than once. Foreign keys are resolved in memory, looking up
+    only the ids of the catalog's parent rows.
+
+    :engine: sqlalchemy.Engine() instance
+    :catalog: iterable of flat dictionaries, as from unnormalize_catalog()
+    :batch_size: number of rows per INSERT
+    :upsert: if False, only insert rows with new natural keys
+    :id_maps: (optional) dict of Table -> natural key -> id of the archives,
+    platforms and documents known to exist, filled in as parents are
+    written. Pass the same dict to successive loads (as apply_diff() does)
+    so that each parent's id is looked up once.
+    :returns: dict of table name -> number of rows inserted (or upserted)
+
+    """
+    archive, platform = Archive.__table__, Platform.__table__
+    document, image = Document.__table__, Image.__table__
+    write = upsert_rows if upsert else insert_missing
+    id_maps = {} if id_maps is None else id_maps
+    rows = rows_from_catalog(catalog)
+    written = {}
+
+    def write_parents(connection, table):
+        id_map = id_maps.setdefault(table, {})
+        new = {key: row for key, row in rows[table].items() if key not in id_map}
+        # Known parents are only written again to update them.
+        written[table.name], _ = write(connection, table,
+                rows[table] if upsert else new, batch_size, with_ids=False)
+        id_map.update(get_id_map(connection, table, new, batch_size))
+        return id_map
+
+    with engine.begin() as connection:
+        archive_ids = write_parents(connection, archive)
+        platform_ids = write_parents(connection, platform)
+
+        for row in rows[document].values():
+            row['archive_id'] = archive_ids.get(row.pop('_archive'))
+            row['platform_id'] = platform_ids.get(row.pop('_platform'))
+        document_ids = write_parents(connection, document)
+
+        for row in rows[image].values():
+            row['document_id'] = document_ids.get(row.pop('_document'))
+        written['image'], _ = write(
+                connection, image, rows[image], batch_size, with_ids=False)
+    return written
+
+def delete_images(connection, uuids, batch_size=1000):
+    """Deletes the images with the given uuids, batch_size per DELETE.
+    Returns the number of rows deleted."""
+    image = Image.__table__
+    uuids = list(uuids)
+    deleted = 0
+    for i in range(0, len(uuids), batch_size):
+        deleted += connection.execute(image.delete()
+                .where(image.c.id.in_(uuids[i:i+batch_size]))).rowcount
+    return deleted
+
+def apply_diff(engine, changes, batch_size=1000):
+    """
+    Applies catalog changes to the database: inserted and updated records
+    are loaded with load_catalog(), and the images of deleted records are
+    removed by uuid. Changes are applied batch_size at a time, one
+    transaction per batch, so a streamed diff is applied in constant memory
+    (but for the ids of archives, platforms and documents, which are cached
+    across batches rather than looked up again for each).
+
+    :engine: sqlalchemy.Engine() instance
+    :changes: iterable of (operation, record) pairs, as from a
+    diff.CatalogDiff or diff.diff_sorted()
+    :batch_size: number of changes per transaction
+    :returns: dict of table name -> number of rows written, and 'deleted'
+
+    """
+    written = {'deleted': 0}
+    id_maps = {}
+
+    def flush(upserts, deletes):
+        if upserts:
+            for name, n in load_catalog(engine, upserts, batch_size,
+                    id_maps=id_maps).items():
+                written[name] = written.get(name, 0) + n
+        if deletes:
+            with engine.begin() as connection:
+                written['deleted'] += delete_images(connection, deletes, batch_size)
+
+    upserts, deletes = [], []
+    for operation, record in changes:
+        if operation == 'delete':
+            if record.get('uuid') is not None:
+                deletes.append(record['uuid'])
+        else:
+            upserts.append(record)
+        if len(upserts) + len(deletes) >= batch_size:
+            flush(upserts, deletes)
+            upserts, deletes = [], []
+    flush(upserts, deletes)
+    return written
+
+def image_order(record):
+    """Sort key of records in the order of image_records(), i.e., of the
+    stored image ids, for diff.sort_catalog() and diff.diff_sorted(). Only
+    defined for records with a uuid; see diff_database()."""
+    return uuid_to_bin(record['uuid'])
+
+def image_records(engine, batch_size=10000):
+    """
+    Yields the images in the database as flat catalog records, with the
+    file-level keys of utils.catalog_file() ('uuid', 'media_type',
+    'file_size', the datetimes and 'checksum'), e.g., to diff a catalog
+    against the database with diff_database(). Images are read in keyset
+    batches ordered by id; see image_order().
+    """
+    image = Image.__table__
+    columns = {'uuid': image.c.id, 'media_type': image.c.file_media_type,
+            'file_size': image.c.file_size,
+            'file_created_datetime': image.c.file_created_datetime,
+            'file_modified_datetime': image.c.file_modified_datetime,
+            'checksum': image.c.file_checksum}
+    last_id = None
+    with engine.connect() as connection:
+        while True:
+            s = select(list(columns.values())).order_by(image.c.id)
+            if last_id is not None:
+                s = s.where(image.c.id > last_id)
+            rows = connection.execute(s.limit(batch_size)).fetchall()
+            if not rows:
+                break
+            for row in rows:
+                yield {key: value.isoformat() if isinstance(value, datetime) else value
+                        for key, value in zip(columns, row) if value is not None}
+            last_id = rows[-1][0]
+
+def diff_database(engine, catalog, fields, chunk_size=500000, tmp_dir=None):
+    """
+    Compares a flat catalog with the images in the database, e.g., to
+    load only what changed with apply_diff(). The catalog's image records
+    are sorted by image_order() with diff.sort_catalog(), then merged with
+    image_records() by diff.diff_sorted(), so neither side need fit in
+    memory. Tag files and 'duplicate_of' records have no image row, and are
+    left out.
+
+    :engine: sqlalchemy.Engine() instance
+    :catalog: iterable of flat dictionaries, as from unnormalize_catalog()
+    :fields: keys to compare, e.g., ['file_size', 'checksum']. Required:
+    database records carry only the keys of image_records(), never
+    'file_path' or inherited metadata, so comparing every key would report
+    every image as updated.
+    :chunk_size: number of records per sorted run, see diff.sort_catalog()
+    :tmp_dir: (optional) directory for the sorted runs
+    :yields: ('insert' | 'update' | 'delete', record) pairs; deletes are
+    images in the database but not in the catalog
+
+    """
+    images = (record for record in catalog
+            if record.get('media_type', '').startswith('image')
+            and record.get('uuid') is not None)
+    yield from diff_sorted(image_records(engine),
+            sort_catalog(images, key=image_order, chunk_size=chunk_size,
+                tmp_dir=tmp_dir),
+            key=image_order, fields=fields)
+
+@contextmanager
+def bulk_load(engine, tables=None):
+    """
+    Drops the secondary (non-unique) indexes of tables for the duration of
+    the with block, and rebuilds them on exit, so that a large load does not
+    update every index row by row. Primary keys, the natural key constraints
+    that upserts rely on, and indexes that back a foreign key (which InnoDB
+    refuses to drop, e.g., ix_image_document_id) are kept.
+
+        with bulk_load(engine):
+            load_catalog(engine, catalog)
+
+    :engine: sqlalchemy.Engine() instance
+    :tables: Tables whose indexes to drop, by default all of natural_keys
+    """
+    tables = list(natural_keys) if tables is None else tables
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        dropped = []
+        for table in tables:
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            foreign_keys = [fk['constrained_columns']
+                    for fk in inspector.get_foreign_keys(table.name)]
+            for index in table.indexes:
+                columns = [column.name for column in index.columns]
+                # An index backs a foreign key if it leads with its columns.
+                if any(columns[:len(fk)] == fk for fk in foreign_keys):
+                    continue
+                if not index.unique and index.name in existing:
+                    index.drop(connection)
+                    dropped.append(index)
+    try:
+        yield engine
+    finally:
+        with engine.begin() as connection:
+            for index in dropped:
+                index.create(connection)
+
+def _table_rows(connection, table, order_by=None, after=None, limit=None):
+    """Selects rows of table as dicts, optionally a keyset batch."""
+    s = select([table])
+    if order_by is not None:
+        s = s.order_by(order_by)
+        if after is not None:
+            s = s.where(order_by > after)
+    if limit is not None:
+        s = s.limit(limit)
+    return [dict(zip(table.c.keys(), row)) for row in connection.execute(s)]
+
+def sync_database(src_engine, dst_engine, batch_size=1000, upsert=True):
+    """
+    Copies archives, platforms, documents and images from one database into
+    another, e.g., from a file-backed SQLite catalog kept on an ingest box
+    into the central MySQL database. Rows are matched by natural key, so
+    surrogate ids of archives, platforms and documents are translated, and a
+    database can be synced more than once.
+
+    Parent tables are written in one transaction. Images are then read in
+    keyset batches (ordered by id) of batch_size and written one transaction
+    per batch, so the source may be larger than memory.
+
+    :src_engine: sqlalchemy.Engine() instance to read from
+    :dst_engine: sqlalchemy.Engine() instance to write to
+    :batch_size: number of rows per SELECT and INSERT
+    :upsert: if False, only insert rows with new natural keys
+    :returns: dict of table name -> number of rows written
+
+    """
+    archive, platform = Archive.__table__, Platform.__table__
+    document, image = Document.__table__, Image.__table__
+    parents = {document: {'archive_id': archive, 'platform_id': platform},
+            image: {'document_id': document}}
+    write = upsert_rows if upsert else insert_missing
+    written = {}
+    # Table -> {source id: destination id}
+    id_maps = {}
+
+    def translate(table, row):
+        for column, parent in parents.get(table, {}).items():
+            row[column] = id_maps[parent].get(row[column])
+        return row
+
+    with src_engine.connect() as src:
+        with dst_engine.begin() as dst:
+            for table in [archive, platform, document]:
+                rows, src_keys = {}, {}
+                for row in _table_rows(src, table):
+                    src_id = row.pop('id')
+                    key = natural_key(table, translate(table, row))
+                    if key is not None:
+                        rows[key] = row
+                        src_keys[src_id] = key
+                written[table.name], dst_ids = write(dst, table, rows, batch_size)
+                id_maps[table] = {src_id: dst_ids.get(key)
+                        for src_id, key in src_keys.items()}
+
+        written[image.name], last_id = 0, None
+        while True:
+            batch = _table_rows(src, image, image.c.id, last_id, batch_size)
+            if not batch:
+                break
+            last_id = batch[-1]['id']
+            rows = {(row['id'],): translate(image, row) for row in batch}
+            with dst_engine.begin() as dst:
+                n, _ = write(dst, image, rows, batch_size, with_ids=False)
+            written[image.name] += n
+    return written
@@ -0,0 +1,87 @@
+#! /usr/bin/env python3
+#
+# 2026-10-16
+# CC-0 Public Domain
+
+"""
+Manifest of previously cataloged files, for incremental re-cataloging
+"""
+
+import os
+import json
+
+class Manifest:
+
+    """On-disk record of the files seen by the last catalog run.
+
+    Files are keyed by path with a signature (size, mtime, inode) and the
+    media type and uuid computed for them. Metadata tag files are keyed the
+    same way, along with their parsed key-value pairs. A file whose
+    signature is unchanged can be cataloged from a single os.stat().
+    """
+
+    def __init__(self, path):
+        """Initializes the Manifest, loading it from path if it exists.
+
+        :path: str, path to the manifest (JSON) file
+
+        """
+        self.path = path
+        self.files = {}
+        self.tagfiles = {}
+        self.seen = set()
+        self.hits = 0
+        self.misses = 0
+        try:
+            with open(self.path, 'r') as fp:
+                content = json.load(fp)
+            self.files = content['files']
+            self.tagfiles = content['tagfiles']
+        except FileNotFoundError:
+            pass
+
+    def __repr__(self):
+        return f"Manifest(path='{self.path}', files={len(self.files)}, "\
+                + f"tagfiles={len(self.tagfiles)})"
+
+    @staticmethod
+    def signature(path):
+        """Returns [size, mtime_ns, inode] for the file at path."""
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+    def get(self, path, table='files'):
+        """
+        Returns the recorded entry for path, or None if the file is new or
+        has changed since it was recorded.
+
+        :table: 'files' or 'tagfiles'
+        """
+        self.seen.add(path)
+        entry = getattr(self, table).get(path)
+        if entry is not None and entry['signature'] == self.signature(path):
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def put(self, path, table='files', **fields):
+        """
+        Records fields for path along with the file's current signature.
+        Call this after any write to the file, e.g., after assigning a uuid.
+        """
+        self.seen.add(path)
+        getattr(self, table)[path] = {'signature': self.signature(path), **fields}
+
+    def prune(self):
+        """Forgets every path not seen since the Manifest was loaded."""
+        for table in [self.files, self.tagfiles]:
+            for path in [p for p in table if p not in self.seen]:
+                del table[path]
+
+    def save(self):
+        """Writes the Manifest to its path, atomically replacing the old one."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as fp:
+            json.dump({'files': self.files, 'tagfiles': self.tagfiles}, fp)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,162 @@
+#! /usr/bin/env python3
+#
+# 2026-10-16
+# CC-0 Public Domain
+
+"""
+Schema migrations for existing databases
+"""
+
+from sqlalchemy import MetaData, Table, UniqueConstraint, inspect, select, text
+
+from .schema import Archive, Platform, Document, Image
+
+def migrate_image_ids(engine, batch_size=10000):
+    """
+    Migrates an existing 'image' table whose 'id' column holds uuids as
+    strings (the original String(36) schema) to the BinaryUUID schema.
+
+    On MySQL this runs in place, converting with UNHEX() in SQL. Elsewhere
+    the old table is renamed, the new table created, and rows copied across
+    in batches (ordered by id) before the old table is dropped.
+
+    :engine: sqlalchemy.Engine() instance
+    :batch_size: number of rows copied per batch (non-MySQL only)
+    :returns: number of rows migrated
+
+    """
+    with engine.begin() as connection:
+        count = connection.execute(text('SELECT COUNT(*) FROM image')).scalar()
+        if engine.dialect.name == 'mysql':
+            # Same byte layout as schema.uuid_to_bin(), for dashless hex ids.
+            connection.execute(text('ALTER TABLE image ADD COLUMN id_bin BINARY(16)'))
+            connection.execute(text(
+                "UPDATE image SET id_bin = UNHEX(CONCAT(SUBSTR(REPLACE(id, '-', ''), 13, 4), "
+                "SUBSTR(REPLACE(id, '-', ''), 9, 4), SUBSTR(REPLACE(id, '-', ''), 1, 8), "
+                "SUBSTR(REPLACE(id, '-', ''), 17, 16)))"))
+            connection.execute(text(
+                'ALTER TABLE image DROP PRIMARY KEY, DROP COLUMN id, '
+                'CHANGE id_bin id BINARY(16) NOT NULL FIRST, ADD PRIMARY KEY (id)'))
+            return count
+
+        connection.execute(text('ALTER TABLE image RENAME TO image_string_id'))
+        old = Table('image_string_id', MetaData(), autoload_with=connection)
+        # Index names may be global (e.g., in SQLite), so free them up first.
+        for index in old.indexes:
+            index.drop(connection)
+        Image.__table__.create(connection)
+
+        columns = [c.name for c in Image.__table__.columns if c.name in old.c]
+        last_id = None
+        while True:
+            s = select([old.c[c] for c in columns]).order_by(old.c.id)
+            if last_id is not None:
+                s = s.where(old.c.id > last_id)
+            rows = [dict(zip(columns, row))
+                    for row in connection.execute(s.limit(batch_size))]
+            if not rows:
+                break
+            connection.execute(Image.__table__.insert(), rows)
+            last_id = rows[-1]['id']
+        old.drop(connection)
+    return count
+
+def migrate_checksums(engine):
+    """
+    Adds the 'file_checksum' column, and its index, to an existing 'image'
+    table created before content checksums were recorded. Existing images
+    are left without a checksum. Safe to run more than once.
+
+    :engine: sqlalchemy.Engine() instance
+    :returns: True if the column was added
+
+    """
+    column = Image.__table__.c.file_checksum
+    index = next(index for index in Image.__table__.indexes
+            if list(index.columns) == [column])
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        added = column.name not in {c['name'] for c in inspector.get_columns('image')}
+        if added:
+            column_type = column.type.compile(dialect=engine.dialect)
+            connection.execute(text(
+                f'ALTER TABLE image ADD COLUMN {column.name} {column_type}'))
+        if index.name not in {i['name'] for i in inspector.get_indexes('image')}:
+            index.create(connection)
+    return added
+
+def migrate_natural_keys(engine, batch_size=1000):
+    """
+    Adds the natural key constraints of the archive, platform and document
+    tables to a database created before they existed, so that upserts match
+    existing rows.
+
+    NULL key columns are set to '' (unique indexes treat NULLs as distinct),
+    rows duplicating a natural key are merged into the one with the lowest
+    id, with their documents and images pointed at it, and the unique index
+    is created if missing. On MySQL and PostgreSQL the key columns are also
+    made NOT NULL; SQLite cannot alter columns, so there the loader's ''
+    for missing key parts is relied on.
+
+    :engine: sqlalchemy.Engine() instance
+    :batch_size: number of ids per UPDATE or DELETE
+    :returns: dict of table name -> number of duplicate rows merged
+
+    """
+    archive, platform = Archive.__table__, Platform.__table__
+    document, image = Document.__table__, Image.__table__
+    # Table -> [(child table, foreign key column)]
+    references = {archive: [(document, 'archive_id')],
+            platform: [(document, 'platform_id')],
+            document: [(image, 'document_id')]}
+    dialect = engine.dialect.name
+    merged = {}
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        for table, children in references.items():
+            constraint = next(c for c in table.constraints
+                    if isinstance(c, UniqueConstraint))
+            columns = [column.name for column in constraint.columns]
+            for column in columns:
+                connection.execute(table.update()
+                        .where(table.c[column].is_(None)).values({column: ''}))
+
+            # Lowest id -> ids of the rows with the same natural key
+            first, duplicates = {}, {}
+            result = connection.execute(select([table.c.id]
+                + [table.c[column] for column in columns]).order_by(table.c.id))
+            for row in result:
+                key = tuple(row[1:])
+                if key in first:
+                    duplicates.setdefault(first[key], []).append(row[0])
+                else:
+                    first[key] = row[0]
+            for keep, ids in duplicates.items():
+                for i in range(0, len(ids), batch_size):
+                    batch = ids[i:i+batch_size]
+                    for child, column in children:
+                        connection.execute(child.update()
+                                .where(child.c[column].in_(batch))
+                                .values({column: keep}))
+                    connection.execute(table.delete().where(table.c.id.in_(batch)))
+            merged[table.name] = sum(len(ids) for ids in duplicates.values())
+
+            nullable = {c['name'] for c in inspector.get_columns(table.name)
+                    if c['nullable']}
+            for column in columns:
+                if column not in nullable:
+                    continue
+                column_type = table.c[column].type.compile(dialect=engine.dialect)
+                if dialect == 'mysql':
+                    connection.execute(text(f"ALTER TABLE {table.name} MODIFY "
+                        f"{column} {column_type} NOT NULL DEFAULT ''"))
+                elif dialect == 'postgresql':
+                    connection.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN "
+                        f"{column} SET DEFAULT '', ALTER COLUMN {column} SET NOT NULL"))
+
+            existing = {c['name'] for c in inspector.get_unique_constraints(table.name)}
+            existing |= {index['name'] for index in inspector.get_indexes(table.name)}
+            if constraint.name not in existing:
+                connection.execute(text(f"CREATE UNIQUE INDEX {constraint.name} "
+                    f"ON {table.name} ({', '.join(columns)})"))
+    return merged
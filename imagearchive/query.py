@@ -0,0 +1,256 @@
+#! /usr/bin/env python3
+#
+# 2026-10-16
+# CC-0 Public Domain
+
+"""
+Filtered, paginated retrieval of images and their documents
+"""
+
+from datetime import date
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import joinedload, selectinload
+
+from .schema import Archive, Platform, Document, Image
+
+class ImageFilter:
+
+    """Typed criteria for selecting images, all of which must hold
+
+    Criteria on documents, archives and platforms only match images that
+    belong to a document. Omitted criteria (None) match every image.
+    """
+
+    def __init__(self, start_date=None, end_date=None, archives=None,
+            platforms=None, media_type=None, document_ids=None):
+        """
+        :start_date: date (or ISO string); documents ending on or after it
+        :end_date: date (or ISO string); documents starting on or before it
+        :archives: iterable of archive names
+        :platforms: iterable of platform names
+        :media_type: media type, or a prefix of one, e.g., 'image/tiff' or 'image/'
+        :document_ids: iterable of Document.id values
+        """
+        self.start_date = self._date(start_date)
+        self.end_date = self._date(end_date)
+        if self.start_date and self.end_date and self.start_date > self.end_date:
+            raise ValueError(f"start_date {self.start_date} is after end_date {self.end_date}")
+        self.archives = self._names(archives, 'archives')
+        self.platforms = self._names(platforms, 'platforms')
+        if media_type is not None and not isinstance(media_type, str):
+            raise TypeError(f"media_type must be a str, not {type(media_type).__name__}")
+        self.media_type = media_type
+        self.document_ids = None if document_ids is None \
+                else [int(i) for i in document_ids]
+
+    def __repr__(self):
+        criteria = ', '.join(f"{k}={v!r}" for k, v in vars(self).items()
+                if v is not None)
+        return f"ImageFilter({criteria})"
+
+    @staticmethod
+    def _date(value):
+        if value is None or isinstance(value, date):
+            return value
+        if isinstance(value, str):
+            return date.fromisoformat(value)
+        raise TypeError(f"Expected a date or ISO format str, not {type(value).__name__}")
+
+    @staticmethod
+    def _names(values, name):
+        if values is None:
+            return None
+        if isinstance(values, str):
+            raise TypeError(f"{name} must be an iterable of names, not a str")
+        return list(values)
+
+    def tables(self):
+        """Returns the tables, besides image, that the criteria refer to."""
+        tables = set()
+        if self.start_date or self.end_date or self.document_ids is not None:
+            tables.add(Document.__table__)
+        if self.archives is not None:
+            tables.update([Document.__table__, Archive.__table__])
+        if self.platforms is not None:
+            tables.update([Document.__table__, Platform.__table__])
+        return tables
+
+    def criteria(self):
+        """Returns the criteria as a list of SQL expressions."""
+        image, document = Image.__table__, Document.__table__
+        criteria = []
+        if self.start_date:
+            criteria.append(func.coalesce(document.c.end_date,
+                document.c.start_date) >= self.start_date)
+        if self.end_date:
+            criteria.append(document.c.start_date <= self.end_date)
+        if self.archives is not None:
+            criteria.append(Archive.__table__.c.name.in_(self.archives))
+        if self.platforms is not None:
+            criteria.append(Platform.__table__.c.name.in_(self.platforms))
+        if self.media_type is not None:
+            criteria.append(image.c.file_media_type.startswith(self.media_type,
+                autoescape=True))
+        if self.document_ids is not None:
+            criteria.append(document.c.id.in_(self.document_ids))
+        return criteria
+
+def _from_clause(tables):
+    """Joins image to the document, archive and platform tables as needed."""
+    image, document = Image.__table__, Document.__table__
+    archive, platform = Archive.__table__, Platform.__table__
+    from_clause = image
+    if tables & {document, archive, platform}:
+        from_clause = from_clause.outerjoin(document,
+                image.c.document_id == document.c.id)
+    if archive in tables:
+        from_clause = from_clause.outerjoin(archive,
+                document.c.archive_id == archive.c.id)
+    if platform in tables:
+        from_clause = from_clause.outerjoin(platform,
+                document.c.platform_id == platform.c.id)
+    return from_clause
+
+def select_images(image_filter=None, columns=None):
+    """
+    Returns a SELECT of columns (by default every column of image) for the
+    images matching image_filter, ordered by Image.id. Columns of the
+    document, archive and platform tables are joined in as needed.
+    """
+    image_filter = image_filter or ImageFilter()
+    columns = list(columns or Image.__table__.columns)
+    tables = image_filter.tables() | {c.table for c in columns}
+    s = select(columns).select_from(_from_clause(tables))
+    for criterion in image_filter.criteria():
+        s = s.where(criterion)
+    return s.order_by(Image.__table__.c.id)
+
+def iter_images(engine, image_filter=None, columns=None, page_size=1000):
+    """
+    Yields rows of columns for the images matching image_filter, one page of
+    page_size rows per query. Pages are sought by the last Image.id seen
+    (keyset pagination) rather than by OFFSET, so every page costs the same
+    however deep into the result it is.
+
+    :engine: sqlalchemy.Engine() instance
+    :image_filter: (optional) ImageFilter
+    :columns: (optional) list of columns, by default those of image
+    :page_size: number of rows per query
+    :yields: result rows
+
+    """
+    image = Image.__table__
+    columns = list(columns or image.columns)
+    # The key must be selected to seek the next page.
+    keys = [i for i, column in enumerate(columns) if column is image.c.id]
+    if not keys:
+        keys.append(len(columns))
+        columns.append(image.c.id)
+    key = keys[0]
+    s = select_images(image_filter, columns)
+    last_id = None
+    with engine.connect() as connection:
+        while True:
+            page = s if last_id is None else s.where(image.c.id > last_id)
+            rows = connection.execute(page.limit(page_size)).fetchall()
+            yield from rows
+            if len(rows) < page_size:
+                break
+            last_id = rows[-1][key]
+
+def stream_images(engine, image_filter=None, columns=None, batch_size=1000):
+    """
+    Yields rows of columns for the images matching image_filter from a
+    single query, through a server-side cursor (stream_results), fetching
+    batch_size rows at a time. Unlike iter_images(), the connection stays
+    busy until the generator is exhausted or closed.
+    """
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True)\
+                .execute(select_images(image_filter, columns))
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+
+def _image_query(session, image_filter):
+    """ORM query for the images matching image_filter, with their document,
+    archive and platform loaded in the same query (joinedload)."""
+    image_filter = image_filter or ImageFilter()
+    query = session.query(Image).options(
+            joinedload(Image.document).joinedload(Document.archive),
+            joinedload(Image.document).joinedload(Document.platform))
+    tables = image_filter.tables()
+    if tables:
+        query = query.join(Image.document)
+    if Archive.__table__ in tables:
+        query = query.join(Document.archive)
+    if Platform.__table__ in tables:
+        query = query.join(Document.platform)
+    return query.filter(*image_filter.criteria()).order_by(Image.id)
+
+def iter_image_objects(session, image_filter=None, page_size=1000):
+    """
+    Yields Image instances matching image_filter, with image.document and
+    its archive and platform already loaded: one query per page of
+    page_size images, sought by Image.id as in iter_images().
+
+    :session: sqlalchemy.orm.Session() instance
+    :image_filter: (optional) ImageFilter
+    :page_size: number of images per query
+    :yields: Image instances
+
+    """
+    query = _image_query(session, image_filter)
+    last_id = None
+    while True:
+        page = query if last_id is None else query.filter(Image.id > last_id)
+        images = page.limit(page_size).all()
+        yield from images
+        if len(images) < page_size:
+            break
+        last_id = images[-1].id
+
+def stream_image_objects(session, image_filter=None, yield_per=1000):
+    """
+    Yields Image instances matching image_filter, as iter_image_objects()
+    does, but from a single query whose rows are buffered yield_per at a
+    time (Query.yield_per(), which streams results where supported).
+    """
+    yield from _image_query(session, image_filter).yield_per(yield_per)
+
+def iter_documents(session, image_filter=None, page_size=100):
+    """
+    Yields Document instances that have at least one image matching
+    image_filter, with document.images, document.archive and
+    document.platform already loaded, in two queries per page of page_size
+    documents: one for the documents (and their archive and platform), and
+    one for all of their images (selectinload). Note that document.images
+    holds every image of a document, not just the matching ones.
+
+    :session: sqlalchemy.orm.Session() instance
+    :image_filter: (optional) ImageFilter
+    :page_size: number of documents per page
+    :yields: Document instances
+
+    """
+    image_filter = image_filter or ImageFilter()
+    image = Image.__table__
+    matching = select([image.c.document_id])\
+            .select_from(_from_clause(image_filter.tables()))
+    for criterion in image_filter.criteria():
+        matching = matching.where(criterion)
+    query = session.query(Document).options(
+            joinedload(Document.archive), joinedload(Document.platform),
+            selectinload(Document.images))\
+            .filter(Document.id.in_(matching)).order_by(Document.id)
+    last_id = None
+    while True:
+        page = query if last_id is None else query.filter(Document.id > last_id)
+        documents = page.limit(page_size).all()
+        yield from documents
+        if len(documents) < page_size:
+            break
+        last_id = documents[-1].id
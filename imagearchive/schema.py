@@ -8,15 +8,49 @@
 Object Relational Mapper
 """
 
-from sqlalchemy import Column, Integer, String, Date, DateTime
+from uuid import UUID
+
+from sqlalchemy import Column, Integer, String, Date, DateTime, BINARY
 from sqlalchemy import UniqueConstraint, ForeignKey
 from sqlalchemy import func
+from sqlalchemy.types import TypeDecorator
 
 from sqlalchemy.orm import relationship
 
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.ext.declarative import declarative_base
 
+def uuid_to_bin(uuid):
+    """
+    Packs a uuid (hex string, with or without dashes) into 16 bytes, moving
+    the uuid1 time fields to the front (time_hi, time_mid, time_low), as
+    MySQL's UUID_TO_BIN(uuid, 1) does. Consecutively minted uuids then sort,
+    and are indexed, next to each other.
+    """
+    h = UUID(str(uuid)).hex
+    return bytes.fromhex(h[12:16] + h[8:12] + h[0:8] + h[16:])
+
+def bin_to_uuid(b):
+    """Inverse of uuid_to_bin(), returning a 32-character hex string."""
+    h = b.hex()
+    return h[8:16] + h[4:8] + h[0:4] + h[16:]
+
+class BinaryUUID(TypeDecorator):
+
+    """Stores uuids as BINARY(16) in time-ordered layout, exposing hex strings"""
+
+    impl = BINARY
+    cache_ok = True
+
+    def __init__(self):
+        super().__init__(length=16)
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else uuid_to_bin(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else bin_to_uuid(value)
+
 class Base(object):
     @declared_attr
     def __tablename__(cls):
@@ -33,8 +67,14 @@ class Archive(Base):
 
     """Abstraction for archives as "original custodians" of documents"""
 
-    name = Column(String(255))
-    country_code = Column(String(3))
+    __table_args__ = (
+            UniqueConstraint('name', 'country_code', name='uq_archive_natural_key'),
+            {'mysql_engine': 'InnoDB'})
+
+    # Natural key columns are NOT NULL: unique indexes treat NULLs as
+    # distinct, so a key with a NULL part would never match on upsert.
+    name = Column(String(255), nullable=False, default='', server_default='')
+    country_code = Column(String(3), nullable=False, default='', server_default='')
 
     def __repr__(self):
         return f"<Archive(name='{self.name}', "\
@@ -44,8 +84,12 @@ class Platform(Base):
 
     """Abstraction for meteorological platforms as "original authors" of documents"""
 
-    name = Column(String(255))
-    country_code = Column(String(3))
+    __table_args__ = (
+            UniqueConstraint('name', 'country_code', name='uq_platform_natural_key'),
+            {'mysql_engine': 'InnoDB'})
+
+    name = Column(String(255), nullable=False, default='', server_default='')
+    country_code = Column(String(3), nullable=False, default='', server_default='')
 
     def __repr__(self):
         return f"<Platform(name='{self.name}', "\
@@ -55,8 +99,13 @@ class Document(Base):
 
     """Abstraction for documents as linearly ordered collections of images"""
 
-    id_within_archive = Column(String(255))
-    id_within_archive_type = Column(String(55))
+    __table_args__ = (
+            UniqueConstraint('id_within_archive', 'id_within_archive_type',
+                name='uq_document_natural_key'),
+            {'mysql_engine': 'InnoDB'})
+
+    id_within_archive = Column(String(255), nullable=False, default='', server_default='')
+    id_within_archive_type = Column(String(55), nullable=False, default='', server_default='')
     start_date = Column(Date)
     end_date = Column(Date)
     license = Column(String(55), default='CC-0 Public Domain')
@@ -88,7 +137,7 @@ class Image(Base):
 
     """Abstraction for metadata corresponding to binary image files"""
 
-    id = Column(String(36), primary_key=True)
+    id = Column(BinaryUUID, primary_key=True)
     wid = Column(Integer)
 
     # add file-level metadata attributes
@@ -97,8 +146,9 @@ class Image(Base):
     file_created_datetime = Column(DateTime)
     file_modified_datetime = Column(DateTime)
     file_original_name = Column(String(255))
+    file_checksum = Column(String(80), index=True) # e.g., 'blake2b:<hexdigest>'
 
-    document_id = Column(Integer, ForeignKey('document.id'))
+    document_id = Column(Integer, ForeignKey('document.id'), index=True)
     document = relationship('Document', back_populates='images')
 
     def __repr__(self):
@@ -109,7 +159,8 @@ class Image(Base):
             + f"('{self.file_created_datetime}'), "\
             + "file_modified_datetime=datetime.fromisoformat"\
             + f"('{self.file_modified_datetime}'), "\
-            + f"file_original_name='{self.file_original_name}')>"
+            + f"file_original_name='{self.file_original_name}', "\
+            + f"file_checksum='{self.file_checksum}')>"
         
 Document.images = relationship('Image', order_by=Image.id,
         back_populates='document', cascade='all, delete, delete-orphan')
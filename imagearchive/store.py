@@ -0,0 +1,208 @@
+#! /usr/bin/env python3
+#
+# 2026-10-16
+# CC-0 Public Domain
+
+"""
+Versioned catalog store of checkpoints and append-only deltas
+"""
+
+import os
+import json
+import datetime
+
+from .catalog import catalog_formats, record_key, read_catalog, write_catalog
+
+class CatalogStore:
+
+    """Directory of catalog versions, located through a single index file.
+
+    The index names the current version, the full catalog (checkpoint) it
+    builds on and the deltas written since. Each delta is a JSON Lines file
+    of 'add', 'change' and 'remove' entries keyed by record_key(), i.e., by
+    uuid. Every checkpoint_every deltas, or on compact(), the current state
+    is written as a new checkpoint and older files are removed. A store
+    assumes a single writer.
+
+        store = CatalogStore(output_dir)
+        store.commit(unnormalize_catalog(get_normalized_catalog(data_dir)))
+        images = [r for r in store.records() if r['media_type'].startswith('image')]
+    """
+
+    index_name = 'catalog-index.json'
+
+    def __init__(self, path, checkpoint_every=16, format='jsonl'):
+        """Initializes the CatalogStore, loading its index if it exists.
+
+        :path: str, directory of the store, created if missing
+        :checkpoint_every: number of deltas after which to checkpoint
+        :format: 'jsonl' or 'parquet', the format of checkpoints
+
+        """
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.format = format
+        self.index = {'version': 0, 'checkpoint': None, 'deltas': []}
+        self._state = None
+        self._state_version = None
+        os.makedirs(path, exist_ok=True)
+        try:
+            with open(os.path.join(self.path, self.index_name), 'r') as fp:
+                self.index = json.load(fp)
+        except FileNotFoundError:
+            pass
+
+    def __repr__(self):
+        return f"CatalogStore(path='{self.path}', version={self.version}, "\
+                + f"deltas={len(self.index['deltas'])})"
+
+    @property
+    def version(self):
+        return self.index['version']
+
+    def _save_index(self):
+        """Writes the index, atomically replacing the old one."""
+        self.index['updated'] = datetime.datetime.now().isoformat()
+        index_path = os.path.join(self.path, self.index_name)
+        with open(f"{index_path}.tmp", 'w') as fp:
+            json.dump(self.index, fp, indent=4)
+        os.replace(f"{index_path}.tmp", index_path)
+
+    def state(self):
+        """
+        Returns the current catalog as a dict of record_key() -> record,
+        read from the checkpoint and deltas named by the index, then cached
+        until the next write. Treat it as read-only.
+        """
+        if self._state_version != self.version:
+            state = {}
+            if self.index['checkpoint'] is not None:
+                for record in read_catalog(
+                        os.path.join(self.path, self.index['checkpoint'])):
+                    state[record_key(record)] = record
+            for delta in self.index['deltas']:
+                for entry in read_catalog(os.path.join(self.path, delta), format='jsonl'):
+                    if entry['op'] == 'remove':
+                        state.pop(entry['key'], None)
+                    else:
+                        state[entry['key']] = entry['record']
+            self._state, self._state_version = state, self.version
+        return self._state
+
+    def records(self):
+        """Returns the records of the current catalog, e.g., for write_catalog()."""
+        return self.state().values()
+
+    def get(self, key, default=None):
+        """Returns the current record for a uuid (or path), or default."""
+        return self.state().get(key, default)
+
+    def checkpoint(self, catalog):
+        """
+        Writes catalog in full as the next version, superseding (but not
+        removing) the previous checkpoint and deltas.
+
+        :catalog: iterable of flat dictionaries
+        :returns: the new version number
+        """
+        state = {record_key(record): dict(record) for record in catalog}
+        version = self.version + 1
+        name = f"catalog-{version:06}{catalog_formats[self.format]}"
+        write_catalog(state.values(), os.path.join(self.path, name), self.format)
+        self.index = {'version': version, 'checkpoint': name, 'deltas': []}
+        self._save_index()
+        self._state, self._state_version = state, version
+        return version
+
+    def append(self, added=(), changed=(), removed=()):
+        """
+        Writes the given changes as a delta on top of the current version,
+        checkpointing instead once checkpoint_every deltas have accumulated.
+        Nothing is written if there are no changes.
+
+        :added: iterable of new records
+        :changed: iterable of records replacing those with the same key
+        :removed: iterable of record_key() values
+        :returns: the (possibly unchanged) version number
+        """
+        entries = [{'op': 'add', 'key': record_key(r), 'record': dict(r)} for r in added]
+        entries += [{'op': 'change', 'key': record_key(r), 'record': dict(r)} for r in changed]
+        entries += [{'op': 'remove', 'key': key} for key in removed]
+        if not entries:
+            return self.version
+
+        state = self.state()
+        for entry in entries:
+            if entry['op'] == 'remove':
+                state.pop(entry['key'], None)
+            else:
+                state[entry['key']] = entry['record']
+        if len(self.index['deltas']) + 1 >= self.checkpoint_every:
+            return self.checkpoint(state.values())
+
+        version = self.version + 1
+        name = f"delta-{version:06}.jsonl"
+        write_catalog(entries, os.path.join(self.path, name), 'jsonl')
+        self.index = {**self.index, 'version': version,
+                'deltas': self.index['deltas'] + [name]}
+        self._save_index()
+        self._state_version = version
+        return version
+
+    def commit(self, catalog, remove_missing=True):
+        """
+        Records catalog as the next version: as a checkpoint if the store is
+        empty, and otherwise as a delta of the records that were added or
+        changed (and, with remove_missing, removed) since the current one.
+
+        :catalog: iterable of flat dictionaries
+        :remove_missing: if False, catalog is partial, e.g., a re-ingest of
+        some directories, and records missing from it are kept
+        :returns: the (possibly unchanged) version number
+        """
+        if self.index['checkpoint'] is None:
+            return self.checkpoint(catalog)
+        state = self.state()
+        added, changed, seen = [], [], set()
+        for record in catalog:
+            key = record_key(record)
+            seen.add(key)
+            current = state.get(key)
+            if current is None:
+                added.append(record)
+            elif current != record:
+                changed.append(record)
+        removed = [key for key in state if key not in seen] if remove_missing else []
+        return self.append(added, changed, removed)
+
+    def compact(self, keep_history=False):
+        """
+        Rewrites the current state as a checkpoint, so later reads skip the
+        deltas, and removes the files the index no longer refers to.
+
+        :keep_history: if True, keep superseded checkpoints and deltas
+        :returns: the new version number
+        """
+        version = self.checkpoint(list(self.records())) \
+                if self.index['deltas'] or self.index['checkpoint'] is None \
+                else self.version
+        if not keep_history:
+            current = {self.index['checkpoint'], self.index_name}
+            for name in os.listdir(self.path):
+                if name not in current and (name.startswith('catalog-')
+                        or name.startswith('delta-')):
+                    os.remove(os.path.join(self.path, name))
+        return version
+
+##
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Compacts a catalog store.')
+    parser.add_argument('path', help='directory of the catalog store')
+    parser.add_argument('--keep-history', action='store_true',
+            help='keep superseded checkpoints and deltas')
+    args = parser.parse_args()
+    store = CatalogStore(args.path)
+    store.compact(keep_history=args.keep_history)
+    print(store)
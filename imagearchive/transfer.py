@@ -0,0 +1,200 @@
+#! /usr/bin/env python3
+#
+# 2026-10-16
+# CC-0 Public Domain
+
+"""
+File transfer strategies between directories
+"""
+
+import os
+import shutil
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# In order of preference: the cheapest way to get src's bytes to dst first.
+copy_strategies = ('hardlink', 'reflink', 'copy_file_range', 'sendfile', 'buffered')
+
+# ioctl request to share a file's extents (Btrfs, XFS, ...), from linux/fs.h
+FICLONE = 0x40049409
+
+buffer_size = 2**20
+
+def _hardlink(src, dst):
+    # Links share one inode; tools that rewrite files (like exiftool) write a
+    # new file and rename it over the old one, so they break the link safely.
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    os.link(src, dst)
+
+def _reflink(src_fd, dst_fd):
+    import fcntl
+    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+
+def _copy_file_range(src_fd, dst_fd):
+    while os.copy_file_range(src_fd, dst_fd, buffer_size * 64):
+        pass
+
+def _sendfile(src_fd, dst_fd):
+    offset = 0
+    while True:
+        sent = os.sendfile(dst_fd, src_fd, offset, buffer_size * 64)
+        if not sent:
+            break
+        offset += sent
+
+def _buffered(src_fd, dst_fd):
+    with open(src_fd, 'rb', closefd=False) as fsrc, \
+            open(dst_fd, 'wb', closefd=False) as fdst:
+        shutil.copyfileobj(fsrc, fdst, buffer_size)
+
+_fd_strategies = {
+        'reflink': _reflink,
+        'copy_file_range': _copy_file_range,
+        'sendfile': _sendfile,
+        'buffered': _buffered,
+        }
+
+def copy_file(src, dst, strategies=None):
+    """
+    Copies the file src to dst (a file path or a directory), trying each
+    strategy in turn until one succeeds: a hardlink, a reflink (FICLONE),
+    an in-kernel copy (os.copy_file_range, then os.sendfile), and finally a
+    buffered copy through userspace. Copied files keep src's permissions.
+
+    :strategies: (optional) a strategy name, or a sequence of names in order
+    of preference, from copy_strategies. Defaults to all of them.
+    :returns: (path to the copy, name of the strategy used)
+
+    """
+    if strategies is None:
+        strategies = copy_strategies
+    elif isinstance(strategies, str):
+        strategies = (strategies,)
+    unknown = [s for s in strategies if s not in copy_strategies]
+    if unknown:
+        raise ValueError(f"Unknown copy strategies {unknown}, expected {copy_strategies}")
+
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        # A path can't be copied onto itself, but a dst hardlinked to src by
+        # an earlier fetch already holds src's bytes.
+        if os.path.normcase(os.path.realpath(src)) == os.path.normcase(os.path.realpath(dst)):
+            raise shutil.SameFileError(f"{src} and {dst} are the same file")
+        return dst, 'hardlink'
+
+    error = None
+    for strategy in strategies:
+        try:
+            if strategy == 'hardlink':
+                _hardlink(src, dst)
+                return dst, strategy
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                _fd_strategies[strategy](fsrc.fileno(), fdst.fileno())
+            shutil.copymode(src, dst)
+            return dst, strategy
+        except (OSError, AttributeError) as e:
+            # e.g., EXDEV across filesystems, EOPNOTSUPP without reflinks, or
+            # AttributeError for os functions missing on this platform.
+            error = e
+    raise OSError(f"Failed to copy {src} to {dst} with {list(strategies)}") from error
+
+class TransferResult:
+
+    """Outcome of a batch of file operations run by run_parallel()
+
+    :successes: list of (item, detail) pairs, e.g., (path, copy strategy)
+    :failures: list of (item, exception) pairs
+    :bytes: number of bytes copied (or deleted)
+    :seconds: wall time of the batch
+    """
+
+    def __init__(self):
+        self.successes = []
+        self.failures = []
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def __repr__(self):
+        return f"TransferResult(successes={len(self.successes)}, "\
+                + f"failures={len(self.failures)}, bytes={self.bytes}, "\
+                + f"seconds={self.seconds:.3f})"
+
+    @property
+    def throughput(self):
+        """Bytes per second over the whole batch."""
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+def run_parallel(func, items, workers=8, queue_size=None):
+    """
+    Applies func to every item on a pool of threads, keeping at most
+    queue_size items in flight, so that items may be a lazy iterator over
+    millions of paths. Exceptions are collected, not raised.
+
+    :func: callable taking an item, returning (detail, number of bytes)
+    :items: iterable of items, e.g., paths
+    :workers: number of threads
+    :queue_size: maximum number of pending items, by default 4*workers
+    :returns: TransferResult
+
+    """
+    queue_size = 4*workers if queue_size is None else queue_size
+    result = TransferResult()
+    start = perf_counter()
+
+    def collect(done):
+        for future in done:
+            item = pending.pop(future)
+            try:
+                detail, nbytes = future.result()
+            except Exception as e:
+                result.failures.append((item, e))
+            else:
+                result.successes.append((item, detail))
+                result.bytes += nbytes
+
+    pending = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for item in items:
+            if len(pending) >= queue_size:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending[pool.submit(func, item)] = item
+        collect(wait(pending).done)
+    result.seconds = perf_counter() - start
+    return result
+
+def remove_path(path):
+    """
+    Removes a file, link or directory tree.
+
+    :returns: ('unlink' or 'rmtree', number of bytes in the removed file)
+    """
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+        return 'rmtree', 0
+    nbytes = os.lstat(path).st_size
+    os.unlink(path)
+    return 'unlink', nbytes
+
+def copy_tree(src_dir, dst_dir, strategies=None, workers=8):
+    """
+    Copies every file below src_dir to the same relative path below dst_dir,
+    creating directories as needed, with copy_file() on a pool of threads.
+
+    :returns: TransferResult, with (relative path, strategy used) successes
+    """
+    def relative_paths():
+        for root, dirs, files in os.walk(src_dir, followlinks=True):
+            rel_root = os.path.relpath(root, src_dir)
+            os.makedirs(os.path.join(dst_dir, rel_root), exist_ok=True)
+            for name in files:
+                yield os.path.normpath(os.path.join(rel_root, name))
+
+    def copy(rel_path):
+        dst, strategy = copy_file(os.path.join(src_dir, rel_path),
+                os.path.join(dst_dir, rel_path), strategies)
+        return strategy, os.path.getsize(dst)
+
+    return run_parallel(copy, relative_paths(), workers=workers)
@@ -9,75 +9,474 @@ Function definitions for the RDA images script (rdai).
 
 # uuid functions
 
-def get_fixed_seq():
-    """Declares/updates global fixed_seq, which seeds mind_uuid()."""
-    global fixed_seq
-    from random import getrandbits
-    fixed_seq = getrandbits(14)
+# 100-ns intervals between the uuid1 epoch (1582-10-15) and the Unix epoch.
+_uuid_epoch_offset = 0x01b21dd213814000
 
-def mint_uuid(node=None):
-    """Returns a semi-sequential uuid. Requires global fixed_seq to have been
-    defined as a seed."""
-    import time
-    from uuid import uuid1, getnode
-    # answered 2019-05-16T13:46 by imposeren, CC-3.0
-    # <https://stackoverflow.com/questions/56119272>
+def _uuid1_hex(timestamp, clock_seq, node):
+    """Formats a uuid1 (version 1, RFC 4122 variant) as a 32-character hex string."""
+    return '%032x' % ((timestamp & 0xffffffff) << 96
+            | ((timestamp >> 32) & 0xffff) << 80
+            | (((timestamp >> 48) & 0x0fff) | 0x1000) << 64
+            | (((clock_seq >> 8) & 0x3f) | 0x80) << 56
+            | (clock_seq & 0xff) << 48
+            | node)
+
+class UuidBlock:
+
+    """A run of pre-allocated uuid timestamps, reserved by a UuidMinter.
+
+    A block can be handed to a worker thread or process (it pickles) and
+    minted from without any further coordination: no other block or minter
+    sharing its clock_seq and node will produce the same timestamps.
+    """
+
+    def __init__(self, start, size, clock_seq, node):
+        self.start = start
+        self.size = size
+        self.clock_seq = clock_seq
+        self.node = node
+        self._next = start
+
+    def __repr__(self):
+        return f"UuidBlock(start={self.start}, size={self.size}, "\
+                + f"remaining={len(self)})"
+
+    def __len__(self):
+        return self.start + self.size - self._next
 
-    # get_fixed_seq() should be called prior to mint_uuid().
-    global fixed_seq
+    def __iter__(self):
+        while len(self):
+            yield self.mint()
 
+    def mint(self):
+        """Returns the next uuid of the block as a 32-character hex string."""
+        if not len(self):
+            raise ValueError(f'{self!r} is exhausted')
+        timestamp, self._next = self._next, self._next + 1
+        return _uuid1_hex(timestamp, self.clock_seq, self.node)
+
+class UuidMinter:
+
+    """Thread-safe source of unique, time-ordered uuids.
+
+    Uuids follow the uuid1 layout, with a fixed clock_seq and node per
+    minter. Timestamps are strictly increasing: if uuids are minted faster
+    than the clock ticks (every 100 ns), the minter runs ahead of the clock
+    rather than repeat a timestamp. For parallel ingest, reserve a UuidBlock
+    per worker with allocate().
+    """
+
+    def __init__(self, node=None, clock_seq=None):
+        """
+        :node: 48-bit node id, by default uuid.getnode()
+        :clock_seq: 14-bit sequence, by default random
+        """
+        import threading
+        from time import time_ns
+        from random import getrandbits
+        from uuid import getnode
+        self._time_ns = time_ns
+        self.node = getnode() if node is None else node
+        self.clock_seq = getrandbits(14) if clock_seq is None else clock_seq
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"UuidMinter(node={self.node}, clock_seq={self.clock_seq})"
+
+    def _reserve(self, n):
+        """Reserves n consecutive timestamps, returning the first."""
+        now = self._time_ns() // 100 + _uuid_epoch_offset
+        with self._lock:
+            start = max(now, self._last + 1)
+            self._last = start + n - 1
+        return start
+
+    def mint(self):
+        """Returns a uuid as a 32-character hex string."""
+        return _uuid1_hex(self._reserve(1), self.clock_seq, self.node)
+
+    def allocate(self, n):
+        """Reserves a UuidBlock of n uuids, e.g., for a worker."""
+        return UuidBlock(self._reserve(n), n, self.clock_seq, self.node)
+
+_minters = {}
+
+def get_fixed_seq():
+    """Reseeds the minters behind mint_uuid() with a new random clock_seq."""
+    _minters.clear()
+
+def mint_uuid(node=None):
+    """Returns a semi-sequential uuid from a module-level UuidMinter (one per
+    node), creating it on first use."""
     # Returns a 32-character hexadecimal string, which can be
     # stored in MySQL as BINARY(16) for efficient indexing. C.f.,
     # <https://mysqlserverteam.com/storing-uuid-values-in-mysql-tables/>
+    # and schema.BinaryUUID.
     try:
-        return uuid1(node=node, clock_seq=fixed_seq).hex
-    except NameError:
-        print("Failed to mint a uuid! Call 'get_fixed_seq()' before trying again.")
+        minter = _minters[node]
+    except KeyError:
+        minter = _minters.setdefault(node, UuidMinter(node=node))
+    return minter.mint()
+
+def get_dependencies_dir():
+    """Returns the path to the bundled dependencies (pyexiftool, exiftool):
+    imagearchive/dependencies in an installed package (see setup.py), else
+    dependencies/ at the root of a source checkout."""
+    import os
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    installed = os.path.join(package_dir, 'dependencies')
+    if os.path.isdir(installed):
+        return installed
+    return os.path.join(os.path.dirname(package_dir), 'dependencies')
 
 def get_exiftool():
-    """Imports exiftool dependencies."""
-    import subprocess
-    repo_dir = subprocess.Popen(['git', 'rev-parse', '--show-toplevel'],
-            stdout=subprocess.PIPE).communicate()[0].rstrip().decode('utf-8')
+    """Imports exiftool dependencies, returning the pyexiftool module."""
+    import os
     import sys
-    sys.path.append(os.path.join(repo_dir, "dependencies/pyexiftool"))
+    pyexiftool_dir = os.path.join(get_dependencies_dir(), 'pyexiftool')
+    if pyexiftool_dir not in sys.path:
+        sys.path.append(pyexiftool_dir)
     import exiftool
-    pass
+    return exiftool
 
-def assign_uuid(filepath, overwrite=False):
-    """Reads EXIF:ImageUniqueID tag for valid uuid. If no uuid exists, write mint_uuid() to EXIF:ImageUniqueID tag."""
-    with exiftool.ExifTool() as et:
-        uuid = et.get_tag('ImageUniqueID', filepath)
+class ExifToolExited(OSError):
 
-        # By default, if the `EXIF:ImageUniqueID` tag is empty, uuid is assigned to None.
-        if (uuid is not None) and (overwrite is False):
-            print("Tag EXIF:ImageUniqueID={} already exists in file {}.".format(uuid, filepath))
+    """The exiftool process exited while a command was running"""
 
-        # Else, no uuid was read by exiftool, or overwrite has been set to True.
-        else:
-            et.execute('-ImageUniqueID={}'.format(mint_uuid()).encode(), filepath.encode())
-            os.remove(filepath+"_original")
+class ExifToolSession:
+
+    """A long-lived exiftool process, shared across every file of an ingest.
+
+    The process is spawned lazily on the first call, restarted if it has
+    died, and terminated when the session is closed. A session is not
+    thread-safe: in a pool, each worker should own its own session.
 
-            # Here, we only report back if the image file's uuid was updated.
-            uuid = et.get_tag('ImageUniqueID', filepath)
-            if uuid is not None:
-                print("Wrote tag EXIF:ImageUniqueID={} to file {}.".format(uuid, filepath))
+    :spawns: number of exiftool processes started by this session
+    :restarts: number of those spawns that replaced a dead process
+    :files: number of files handled through this session
+
+    """
+
+    def __init__(self, executable=None):
+        self.executable = executable
+        self._et = None
+        self.spawns = 0
+        self.restarts = 0
+        self.files = 0
+
+    def __repr__(self):
+        return f"ExifToolSession(spawns={self.spawns}, "\
+                + f"restarts={self.restarts}, files={self.files})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.terminate()
+
+    @property
+    def running(self):
+        """True if the exiftool subprocess is alive."""
+        return (self._et is not None and self._et.running
+                and self._et._process.poll() is None)
+
+    @property
+    def spawns_avoided(self):
+        """Spawns saved relative to starting one exiftool process per file."""
+        return max(self.files - self.spawns, 0)
+
+    def start(self):
+        """Starts the exiftool subprocess, unless it is already running."""
+        if self.running:
+            return self
+        if self._et is not None:
+            # The previous process died underneath us.
+            self.restarts += 1
+            self.terminate()
+        self._et = get_exiftool().ExifTool(self.executable)
+        self._et.start()
+        self.spawns += 1
+        return self
+
+    def terminate(self):
+        """Stops the exiftool subprocess, if any."""
+        if self._et is None:
+            return
+        try:
+            self._et.terminate()
+        except (BrokenPipeError, OSError):
+            # The process is already gone; nothing left to shut down.
+            self._et.running = False
+        self._et = None
+
+    def _call(self, func, *args):
+        """Calls func, restarting a dead exiftool process and retrying once.
+        If the retry kills exiftool too (e.g., on a corrupt file), the
+        ExifToolExited is raised, and the next call starts a new process."""
+        self.start()
+        try:
+            return func(*args)
+        except (BrokenPipeError, ExifToolExited):
+            self.start()
+            return func(*args)
+
+    def _execute(self, *params):
+        # pyexiftool's execute() reads until the '{ready}' sentinel, and
+        # spins forever on the empty reads of a process that has exited.
+        import os
+        exiftool = get_exiftool()
+        process = self._et._process
+        process.stdin.write(b"\n".join(params + (b"-execute\n",)))
+        process.stdin.flush()
+        output = b""
+        fd = process.stdout.fileno()
+        while not output[-32:].strip().endswith(exiftool.sentinel):
+            block = os.read(fd, exiftool.block_size)
+            if not block:
+                # Reap the process, so that start() sees it is gone.
+                process.kill()
+                returncode = process.wait()
+                raise ExifToolExited(f"exiftool exited with status {returncode} "\
+                        + "while running a command")
+            output += block
+        return output.strip()[:-len(exiftool.sentinel)]
+
+    def execute(self, *params):
+        return self._call(self._execute, *params)
+
+    def execute_json(self, *params):
+        import os
+        import json
+        output = self.execute(b'-j', *(os.fsencode(p) for p in params))
+        return json.loads(output.decode('utf-8'))
+
+    def get_tag(self, tag, filename):
+        return self.get_tag_batch(tag, [filename])[0]
+
+    def get_tag_batch(self, tag, filenames):
+        return [next((v for k, v in record.items() if k != 'SourceFile'), None)
+                for record in self.execute_json(f'-{tag}', *filenames)]
+
+    def get_tag_by_path(self, tag, filenames):
+        """Extracts a single tag from the given files in one call.
+
+        :returns: dict of path -> tag value (or None, if the tag is empty).
+        Files exiftool cannot find or read are left out of its output, so
+        they are missing from the dict too.
+        """
+        import os
+        import json
+        output = self.execute(b'-j', f'-{tag}'.encode(),
+                *(os.fsencode(f) for f in filenames))
+        # exiftool prints nothing at all if no file could be read.
+        records = json.loads(output.decode('utf-8')) if output else []
+        return {record['SourceFile']: next((v for k, v in record.items()
+            if k.split(':')[-1] == tag), None) for record in records}
+
+def assign_uuid(filepath, overwrite=False, session=None):
+    """Reads EXIF:ImageUniqueID tag for valid uuid. If no uuid exists, write mint_uuid() to EXIF:ImageUniqueID tag.
+
+    :session: (optional) an ExifToolSession to reuse; by default a
+    single-use session is opened for this file only.
+    """
+    import os
+    if session is None:
+        with ExifToolSession() as session:
+            return assign_uuid(filepath, overwrite=overwrite, session=session)
+
+    session.files += 1
+    uuid = session.get_tag('ImageUniqueID', filepath)
+
+    # By default, if the `EXIF:ImageUniqueID` tag is empty, uuid is assigned to None.
+    if (uuid is not None) and (overwrite is False):
+        print("Tag EXIF:ImageUniqueID={} already exists in file {}.".format(uuid, filepath))
+
+    # Else, no uuid was read by exiftool, or overwrite has been set to True.
+    else:
+        session.execute('-ImageUniqueID={}'.format(mint_uuid()).encode(), filepath.encode())
+        os.remove(filepath+"_original")
+
+        # Here, we only report back if the image file's uuid was updated.
+        uuid = session.get_tag('ImageUniqueID', filepath)
+        if uuid is not None:
+            print("Wrote tag EXIF:ImageUniqueID={} to file {}.".format(uuid, filepath))
     return uuid
 
+def assign_uuids_batch(paths, chunk_size=500, overwrite=False, session=None,
+        minter=None):
+    """Batched assign_uuid(): reads EXIF:ImageUniqueID for a chunk of files in
+    one exiftool call, writes minted uuids to every file lacking one in a
+    second call (one '-executeNUM' command per file, chained on the same
+    pipe), then verifies the writes with a third, batched read.
+
+    :paths: iterable of paths to image files
+    :chunk_size: number of files sent to exiftool per round-trip
+    :overwrite: if True, mint and write new uuids for every file
+    :session: (optional) an ExifToolSession to reuse
+    :minter: (optional) UuidMinter or UuidBlock to mint from, by default
+    mint_uuid()'s
+    :returns: list of uuids (or None, if a file could not be read or a
+    write failed), in order of paths
+
+    """
+    if session is None:
+        with ExifToolSession() as session:
+            return assign_uuids_batch(paths, chunk_size=chunk_size,
+                    overwrite=overwrite, session=session, minter=minter)
+
+    mint = mint_uuid if minter is None else minter.mint
+    paths = [str(p) for p in paths]
+    uuids = []
+    for i in range(0, len(paths), chunk_size):
+        chunk = paths[i:i+chunk_size]
+        session.files += len(chunk)
+        # Keyed by path, since exiftool skips files it cannot read.
+        found = session.get_tag_by_path('ImageUniqueID', chunk)
+
+        to_write = [(path, mint()) for path in chunk
+                if path in found and (overwrite or found[path] is None)]
+        if to_write:
+            params = []
+            for n, (path, uuid) in enumerate(to_write, start=1):
+                params.extend([f'-ImageUniqueID={uuid}'.encode(),
+                    b'-overwrite_original', path.encode()])
+                # exiftool answers '-executeNUM' with '{readyNUM}', so only
+                # the final, implicit '-execute' ends the batch's output.
+                if n < len(to_write):
+                    params.append(f'-execute{n}'.encode())
+            session.execute(*params)
+
+            # Verify the writes with one more batched read.
+            written = session.get_tag_by_path('ImageUniqueID',
+                    [path for path, _ in to_write])
+            for path, _ in to_write:
+                found[path] = written.get(path)
+            print(f"Wrote tag EXIF:ImageUniqueID to "\
+                    + f"{sum(written.get(path) == uuid for path, uuid in to_write)} "\
+                    + f"of {len(to_write)} files.")
+        uuids.extend(found.get(path) for path in chunk)
+    return uuids
+
+# checksum functions
+
+def get_hasher(algorithm='blake2b'):
+    """Returns a new streaming hash object for algorithm: 'blake2b' (128-bit,
+    in the standard library), or 'xxh3_128' or 'blake3' if the xxhash or
+    blake3 packages are installed."""
+    if algorithm == 'blake2b':
+        import hashlib
+        return hashlib.blake2b(digest_size=16)
+    if algorithm == 'xxh3_128':
+        import xxhash
+        return xxhash.xxh3_128()
+    if algorithm == 'blake3':
+        from blake3 import blake3
+        return blake3()
+    raise ValueError(f"Unknown checksum algorithm '{algorithm}'")
+
+def stat_fields(st):
+    """File size and timestamps of an os.stat_result, as catalog fields
+    (ISO 8601 strings). 'file_created_datetime' is only given where the
+    platform records a birth time; the inode change time is no creation time."""
+    from datetime import datetime
+    fields = {
+            'file_size': st.st_size,
+            'file_modified_datetime': datetime.fromtimestamp(st.st_mtime).isoformat(),
+            }
+    if hasattr(st, 'st_birthtime'):
+        fields['file_created_datetime'] = datetime.fromtimestamp(st.st_birthtime).isoformat()
+    return fields
+
+def probe_file(file_path, checksum=None, header_size=2**16, buffer_size=2**20):
+    """Probes a file through a single open(): one os.fstat() for its size and
+    timestamps, one read of its header for libmagic (magic.from_buffer) and,
+    if a checksum algorithm is given, further reads of the rest for the hash.
+    Size, timestamps and checksum are of the file as read, i.e., before any
+    uuid is written to it.
+
+    :checksum: (optional) algorithm name, see get_hasher()
+    :header_size: number of bytes read for libmagic
+    :returns: dictionary with 'media_type' and the fields of stat_fields(),
+    and 'checksum' ('algorithm:hexdigest') if requested
+    """
+    import os
+    import magic
+    with open(file_path, 'rb') as fp:
+        header = fp.read(header_size)
+        probe = {
+                'media_type': magic.from_buffer(header, mime=True),
+                **stat_fields(os.fstat(fp.fileno())),
+                }
+        if checksum is not None:
+            hasher = get_hasher(checksum)
+            block = header
+            while block:
+                hasher.update(block)
+                block = fp.read(buffer_size)
+            probe['checksum'] = f'{checksum}:{hasher.hexdigest()}'
+    return probe
+
+def catalog_file(file_path, overwrite=False, session=None, checksum=None,
+        duplicates=None):
+    """Collects file-level metadata for a catalog with probe_file(): the media
+    type, size and timestamps, the checksum (if requested) and, for images
+    only, the uuid. Only images are passed on to exiftool.
+
+    An image whose checksum is found in duplicates is not assigned a uuid;
+    it is marked 'duplicate_of' the uuid it maps to instead. Images that are
+    assigned a uuid are added to duplicates, so repeats within one catalog
+    are caught too.
+
+    Images are stat'ed again once their uuid is written, so size and
+    timestamps describe the file as archived. The checksum is of the file as
+    received, which is what re-sent duplicates will match; a Manifest keeps
+    it for re-catalogs, which would otherwise hash the archived bytes.
+
+    :checksum: (optional) algorithm name, see get_hasher()
+    :duplicates: (optional) mapping of checksum -> uuid of images already
+    archived, e.g., loader.ChecksumIndex or a dict
+    :returns: dictionary of file-level metadata, without 'file_path'
+
+    """
+    import os
+    metadata = probe_file(file_path, checksum)
+    digest = metadata.get('checksum')
+    if metadata['media_type'].startswith("image"):
+        duplicate = None if (duplicates is None or digest is None) \
+                else duplicates.get(digest)
+        if duplicate is not None:
+            metadata['duplicate_of'] = duplicate
+        else:
+            metadata['uuid'] = assign_uuid(file_path, overwrite=overwrite,
+                    session=session)
+            metadata.update(stat_fields(os.stat(file_path)))
+            if duplicates is not None and digest is not None:
+                duplicates[digest] = metadata['uuid']
+    return metadata
+
 # metadata functions 
 
 # see 2019-11-21-minimal-working-example for an implementation
 
-def pool_metadata(tagfile, normalized_catalog):
+def pool_metadata(tagfile, normalized_catalog, manifest=None):
     """Collects key-value pairs from a given metadata tag file (here '.csv' or '.tsv'),
     then updates a given normalized catalog. TODO Add args for json or xml.
 
     :tagfile: Relative path to metadata file.
     :normalized_catalog: Dictionary to write out key-value pairs.
+    :manifest: (optional) Manifest; the tagfile is only re-parsed if it changed.
     :returns: Updated content dictionary.
 
     """
     import csv
+    if manifest is not None:
+        cached = manifest.get(tagfile, 'tagfiles')
+        if cached is None:
+            cached = {'metadata': pool_metadata(tagfile, {})}
+            manifest.put(tagfile, 'tagfiles', **cached)
+        return {**normalized_catalog, **cached['metadata']}
+
     # Initial state.
     to_parse = False 
 
@@ -116,21 +515,33 @@ def pool_metadata(tagfile, normalized_catalog):
     # Return normalized_catalog updated with key/value pairs from tagfile.
     return normalized_catalog
 
-def get_normalized_catalog(data_dir, overwrite=False):
+def get_normalized_catalog(data_dir, overwrite=False, session=None, manifest=None,
+        checksum=None, duplicates=None):
     """Catalogs the files and directories below the data_dir (relative path),
     given '.csv' or '.tsv' metadata (TODO or '.json') in the directory tree.
 
     :pool_metadata: "metadata gathering" function defined below.
 
     :data_dir: Relative path to directory to be cataloged. Should be a directory.
+    :session: (optional) ExifToolSession threaded through the whole tree walk.
+    By default, one session is opened here and closed when the walk is done.
+    :manifest: (optional) Manifest of a previous run. Unchanged files are
+    cataloged from the manifest, and new or modified files are recorded in it.
+    :checksum: (optional) checksum algorithm, see catalog_file()
+    :duplicates: (optional) checksum -> uuid mapping, see catalog_file()
     :returns: Nested json describing files, directories, and metadata.
 
     """
     from pathlib import Path
     import os
-    import magic
     import csv
 
+    if session is None:
+        with ExifToolSession() as session:
+            return get_normalized_catalog(data_dir, overwrite=overwrite,
+                    session=session, manifest=manifest, checksum=checksum,
+                    duplicates=duplicates)
+
     # Suppose data_dir is a parent.
     parent = Path(data_dir)
 
@@ -141,7 +552,10 @@ def get_normalized_catalog(data_dir, overwrite=False):
         # List relative paths to children.
         children = [os.path.join(parent, x) for x in sorted(os.listdir(parent))]
         # Recurse down by calling `get_normalized_catalog` for each child.
-        normalized_catalog['contents'] = [get_normalized_catalog(child, overwrite=overwrite) 
+        normalized_catalog['contents'] = [
+                get_normalized_catalog(child, overwrite=overwrite,
+                    session=session, manifest=manifest, checksum=checksum,
+                    duplicates=duplicates)
                 for child in children 
                 if not os.path.basename(child).startswith(".")]
         # Note. We reserve the key 'contents' for inclusion of lists of child
@@ -155,73 +569,292 @@ def get_normalized_catalog(data_dir, overwrite=False):
             # TODO Test for xml or json or ini files
             if ext in ['.csv', '.tsv']:
                 # Update `normalized_catalog` with metadata from child.
-                normalized_catalog = pool_metadata(child, normalized_catalog)
+                normalized_catalog = pool_metadata(child, normalized_catalog,
+                        manifest=manifest)
 
     # If the parent is not a directory, write out file-level metadata.
     # This is the floor of the recursive function call.
     else:
         normalized_catalog['file_path'] = str(parent)
-        normalized_catalog['media_type'] = magic.from_file(str(parent), mime=True)
-        # Eventually I'd like to restructure the program to recurse on
-        # filetypes, so as to avoid reading headers redunandtly. At that
-        # point, python-magic might not need to test for the file media_type. 2019-07-27
-        if normalized_catalog['media_type'].startswith("image"):
-            normalized_catalog['uuid'] = assign_uuid(str(parent), overwrite=overwrite)
+        cached = None if manifest is None else manifest.get(str(parent))
+        if cached is not None and not overwrite:
+            normalized_catalog.update({k:v for k,v in cached.items()
+                if k != 'signature'})
+            return normalized_catalog
+
+        # The header is read once, by probe_file(), for libmagic; only image
+        # files go on to exiftool.
+        normalized_catalog.update(catalog_file(str(parent), overwrite=overwrite,
+            session=session, checksum=checksum, duplicates=duplicates))
+        if manifest is not None:
+            # Record the file only now, since assigning a uuid rewrites it.
+            manifest.put(str(parent), **{k:v for k,v in normalized_catalog.items()
+                if k != 'file_path'})
+
+    return normalized_catalog
+
+def get_incremental_catalog(data_dir, manifest_path=None, overwrite=False):
+    """Incremental get_normalized_catalog(). Loads the manifest left by the
+    previous run, so that only new or modified files are sniffed by libmagic
+    and exiftool, and only changed tag files are re-parsed. The manifest is
+    then pruned of deleted files and saved for the next run.
 
+    :data_dir: Relative path to directory to be cataloged.
+    :manifest_path: path to the manifest, by default '.manifest.json' in
+    data_dir (hidden, so never cataloged itself)
+    :returns: Nested json describing files, directories, and metadata.
+
+    """
+    import os
+    from .manifest import Manifest
+    if manifest_path is None:
+        manifest_path = os.path.join(data_dir, '.manifest.json')
+    manifest = Manifest(manifest_path)
+    normalized_catalog = get_normalized_catalog(data_dir, overwrite=overwrite,
+            manifest=manifest)
+    manifest.prune()
+    manifest.save()
     return normalized_catalog
 
-# TODO forgot to optimize recursive step with filter <ccg, 2020-05-04> 
-# also this is illegible: "flist"?! first list?! 
-
-def tail_flatten_list(flist,nlists):
-    if nlists == []:
-        return flist
-    new_nlists = []
-    new_flist = flist
-    for nl in nlists:
-        items = [i for i in nl if type(i) != list]
-        lists = [l for l in nl if l not in items]
-        new_flist.extend(items)
-        new_nlists.extend(lists)
-    return tail_flatten_list(new_flist, new_nlists)
+def iter_catalog(data_dir, overwrite=False, session=None, checksum=None,
+        duplicates=None, compact=False):
+    """Streaming, flat counterpart to unnormalize_catalog(get_normalized_catalog()).
+    Walks the tree below data_dir once with os.scandir, keeping a stack of
+    inherited tag file metadata (one layer per directory level), and yields
+    one flat record per file. Memory scales with the depth of the tree, not
+    with the number of files.
+
+    Records are yielded depth first, in sorted order within each directory,
+    whereas unnormalize_catalog() lists shallower files first.
+
+    :data_dir: Relative path to directory to be cataloged.
+    :session: (optional) ExifToolSession used for the whole walk.
+    :checksum: (optional) checksum algorithm, see catalog_file()
+    :duplicates: (optional) checksum -> uuid mapping, see catalog_file()
+    :compact: if True, yield catalog.CatalogRecord mappings that share one
+    copy of each directory's metadata, instead of dictionaries.
+    :yields: dictionaries of inherited metadata and file-level metadata.
+
+    """
+    import os
+    from pathlib import Path
+    from .catalog import CatalogRecord, metadata_layer
+
+    if session is None:
+        with ExifToolSession() as session:
+            yield from iter_catalog(data_dir, overwrite=overwrite,
+                    session=session, checksum=checksum, duplicates=duplicates,
+                    compact=compact)
+        return
+
+    def file_record(file_path, metadata):
+        fields = {'file_path': file_path,
+                **catalog_file(file_path, overwrite=overwrite, session=session,
+                    checksum=checksum, duplicates=duplicates)}
+        if compact:
+            return CatalogRecord(fields, metadata)
+        return {**metadata, **fields}
+
+    def open_level(dir_path, metadata):
+        # Tag files apply to every file at or below their directory, so pool
+        # them before descending.
+        with os.scandir(dir_path) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+        for entry in entries:
+            _, ext = os.path.splitext(entry.name)
+            if ext in ['.csv', '.tsv'] and entry.is_file():
+                metadata = pool_metadata(entry.path, metadata)
+        return (iter([e for e in entries if not e.name.startswith(".")]),
+                metadata_layer(metadata) if compact else metadata)
+
+    root = str(Path(data_dir))
+    if not os.path.isdir(root):
+        yield file_record(root, {})
+        return
+
+    stack = [open_level(root, {})]
+    while stack:
+        entries, metadata = stack[-1]
+        entry = next(entries, None)
+        if entry is None:
+            stack.pop()
+        elif entry.is_dir():
+            stack.append(open_level(entry.path, metadata))
+        else:
+            yield file_record(entry.path, metadata)
+
+def _init_catalog_worker():
+    """Gives each catalog worker process its own ExifToolSession."""
+    global _worker_session
+    from multiprocessing.util import Finalize
+    _worker_session = ExifToolSession()
+    # Stop this worker's exiftool process when the worker exits.
+    Finalize(_worker_session, _worker_session.terminate, exitpriority=10)
+
+def _catalog_files(paths, block, overwrite=False, checksum=None):
+    """Probes a chunk of files, assigning uuids to images from a UuidBlock
+    reserved for the chunk. Images are stat'ed again after their uuids are
+    written, as in catalog_file().
+
+    :returns: list of file-level metadata dictionaries, in order of paths
+    """
+    import os
+    probes = [probe_file(path, checksum) for path in paths]
+    images = [path for path, probe in zip(paths, probes)
+            if probe['media_type'].startswith("image")]
+    uuids = dict(zip(images, assign_uuids_batch(images,
+        chunk_size=max(len(images), 1), overwrite=overwrite,
+        session=_worker_session, minter=block)))
+    for path, probe in zip(paths, probes):
+        if path in uuids:
+            probe['uuid'] = uuids[path]
+            if uuids[path] is not None:
+                probe.update(stat_fields(os.stat(path)))
+    return probes
+
+def get_normalized_catalog_parallel(data_dir, overwrite=False, workers=None,
+        chunk_size=100, checksum=None):
+    """Parallel get_normalized_catalog(). The directory tree is enumerated
+    first, then file probing and uuid assignment are fanned out in
+    chunks to a pool of worker processes, each owning a persistent
+    ExifToolSession and minting from a UuidBlock reserved for each chunk, so
+    uuids are unique across workers. The nested catalog is reassembled in sorted order and
+    so is identical to the output of get_normalized_catalog().
+
+    :data_dir: Relative path to directory to be cataloged.
+    :workers: number of worker processes, by default os.cpu_count()
+    :chunk_size: number of files sent to a worker at a time
+    :checksum: (optional) checksum algorithm, see probe_file()
+    :returns: Nested json describing files, directories, and metadata.
+
+    """
+    import os
+    from functools import partial
+    from pathlib import Path
+    from concurrent.futures import ProcessPoolExecutor
+
+    # File-level dictionaries, in tree order, awaiting media_type and uuid.
+    files = []
+
+    def enumerate_tree(parent):
+        normalized_catalog = {}
+        if parent.is_dir():
+            children = [os.path.join(parent, x) for x in sorted(os.listdir(parent))]
+            normalized_catalog['contents'] = [enumerate_tree(Path(child))
+                    for child in children
+                    if not os.path.basename(child).startswith(".")]
+            for child in children:
+                _, ext = os.path.splitext(child)
+                if ext in ['.csv', '.tsv']:
+                    normalized_catalog = pool_metadata(child, normalized_catalog)
+        else:
+            normalized_catalog['file_path'] = str(parent)
+            files.append(normalized_catalog)
+        return normalized_catalog
+
+    normalized_catalog = enumerate_tree(Path(data_dir))
+
+    paths = [f['file_path'] for f in files]
+    chunks = [paths[i:i+chunk_size] for i in range(0, len(paths), chunk_size)]
+    minter = UuidMinter()
+    blocks = [minter.allocate(len(chunk)) for chunk in chunks]
+    with ProcessPoolExecutor(max_workers=workers,
+            initializer=_init_catalog_worker) as pool:
+        results = pool.map(partial(_catalog_files, overwrite=overwrite,
+            checksum=checksum), chunks, blocks)
+        probes = [probe for chunk in results for probe in chunk]
+
+    for f, probe in zip(files, probes):
+        f.update(probe)
+    return normalized_catalog
 
 def flatten_list(nl):
-      items = [i for i in nl if type(i) != list]
-      lists = [l for l in nl if l not in items]
-      return tail_flatten_list(items, lists)
+    """Flattens a nested list level by level: items at the top level come
+    first, then items one level down, and so on. Runs in linear time and
+    without recursion.
+    """
+    from collections import deque
+    flat = []
+    queue = deque([nl])
+    while queue:
+        for i in queue.popleft():
+            if type(i) == list:
+                queue.append(i)
+            else:
+                flat.append(i)
+    return flat
+
+def unnormalize_catalog(normalized_catalog, compact=False):
+    """Flattens a normalized catalog into a list with one dictionary per file,
+    each merged with the metadata of every directory above it. Files nearer
+    the top of the tree are listed first. Runs in linear time and without
+    recursion.
+
+    :normalized_catalog: Nested json, as from get_normalized_catalog().
+    :compact: if True, return catalog.CatalogRecord mappings that share one
+    copy of each directory's metadata, instead of dictionaries.
+    :returns: List of flat dictionaries.
 
-def tail_unnormalize_catalog(flatdict,lowerdicts):
+    """
+    from collections import deque
+    from .catalog import CatalogRecord, metadata_layer
     behead = lambda catalog: {k:v for k,v in catalog.items() if k != 'contents'}
-    assimilate = lambda flatdict, catalog: \
-        tail_unnormalize_catalog(
-                {**flatdict, **behead(catalog)}, catalog['contents']) \
-        if 'contents' in set(catalog.keys()) \
-        else {**flatdict, **catalog}
-    return [assimilate(flatdict, catalog) for catalog in lowerdicts]
-
-def unnormalize_catalog(normalized_catalog):
-    flatdict = {k:v for k,v in normalized_catalog.items() if k != 'contents'}
-    lowerdicts = normalized_catalog['contents']
-    catalog = flatten_list(tail_unnormalize_catalog(flatdict, lowerdicts))
+    catalog = []
+    # Each entry pairs the merged metadata of a directory with its contents.
+    queue = deque([(behead(normalized_catalog), normalized_catalog['contents'])])
+    while queue:
+        flatdict, lowerdicts = queue.popleft()
+        if compact:
+            layer = metadata_layer(flatdict)
+        for lowerdict in lowerdicts:
+            if 'contents' in lowerdict:
+                queue.append(({**flatdict, **behead(lowerdict)},
+                    lowerdict['contents']))
+            elif compact:
+                catalog.append(CatalogRecord(lowerdict, layer))
+            else:
+                catalog.append({**flatdict, **lowerdict})
     return catalog
 
-def write_timestamped_catalog(catalog, output_dir):
-    import json 
+def write_timestamped_catalog(catalog, output_dir, format='json'):
+    """Writes catalog to output_dir as '<timestamp>-catalog.<format>', with
+    format 'json', 'jsonl' or 'parquet' (see catalog.write_catalog()). If
+    output_dir holds a store.CatalogStore, the catalog (read back from the
+    file, so that it may be a generator) is also committed to the store as
+    its next version, which read_timestamped_catalog() then returns.
+    Returns the path written."""
     import os
     import datetime
+    from .catalog import catalog_formats, read_catalog, write_catalog
+    from .store import CatalogStore
     ts = str(datetime.datetime.now().strftime("%Y-%m-%d-%H%M%S"))
-    with open(os.path.join(output_dir, '{}-catalog.json'.format(ts)), 'w') as fp:
-        json.dump(catalog, fp, indent=4)
-
-def read_timestamped_catalog(output_dir):
-    import json
+    path = os.path.join(output_dir, '{}-catalog{}'.format(ts, catalog_formats[format]))
+    write_catalog(catalog, path, format)
+    if os.path.exists(os.path.join(output_dir, CatalogStore.index_name)):
+        CatalogStore(output_dir).commit(read_catalog(path, format=format))
+    return path
+
+def read_timestamped_catalog(output_dir, columns=None, where=None):
+    """Reads the most recent '*-catalog.*' file in output_dir, in any format,
+    keeping only columns and the records matching where (see
+    catalog.read_catalog()). If output_dir holds a store.CatalogStore, its
+    current version is read instead, without listing the directory.
+    Returns a list of flat dictionaries."""
     import os
     import glob
+    from .catalog import catalog_formats, matches, read_catalog
+    from .store import CatalogStore
+    if os.path.exists(os.path.join(output_dir, CatalogStore.index_name)):
+        return [record if columns is None else
+                {k: record[k] for k in columns if k in record}
+                for record in CatalogStore(output_dir).records()
+                if matches(record, where or [])]
     try:
-        most_recent_catalog = [c for c in 
-                sorted(glob.glob(os.path.join(output_dir,'*-catalog.json')))][-1]
-        with open(most_recent_catalog, 'r') as fp:
-            catalog = json.load(fp)
-        return catalog
+        most_recent_catalog = sorted(
+                (c for ext in catalog_formats.values()
+                    for c in glob.glob(os.path.join(output_dir, '*-catalog' + ext))),
+                key=os.path.basename)[-1]
+        return list(read_catalog(most_recent_catalog, columns, where))
     except IndexError: 
-        print("The directory {} does not contain a JSON catalog ending in '*-catalog.json'.".format(output_dir))
+        print("The directory {} does not contain a catalog matching '*-catalog{{{}}}'.".format(
+            output_dir, ','.join(catalog_formats.values())))
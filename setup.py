@@ -1,5 +1,12 @@
+import os
 from setuptools import setup, find_packages
 
+def package_files(directory):
+    """Lists every file below directory, relative to it, for package_data."""
+    return [os.path.relpath(os.path.join(root, name), directory)
+            for root, dirs, files in os.walk(directory) for name in files
+            if '__pycache__' not in root]
+
 with open('README.md') as f:
     readme = f.read()
 
@@ -15,6 +22,9 @@ setup(
     author_email='colton.grainger@gmail.com',
     url='https://github.com/coltongrainger/imagearchive',
     license=license,
-    packages=find_packages(exclude=('tests', 'docs'))
+    packages=find_packages(exclude=('tests', 'docs')) + ['imagearchive.dependencies'],
+    # Ship the bundled pyexiftool and exiftool inside the installed package.
+    package_dir={'imagearchive.dependencies': 'dependencies'},
+    package_data={'imagearchive.dependencies': package_files('dependencies')},
 )
 
@@ -0,0 +1,55 @@
+#! /usr/bin/env python3
+#
+# 2026-10-16
+# CC-0 Public Domain
+
+"""
+Benchmark: memory per record of a flattened catalog, as dictionaries vs.
+compact CatalogRecords, for a 100k-page logbook.
+"""
+
+from context import imagearchive
+from imagearchive.utils import unnormalize_catalog
+from imagearchive.catalog import CatalogRecord
+
+import tracemalloc
+from time import perf_counter
+
+n_files, files_per_dir = 100000, 500
+
+def synthetic_catalog():
+    """Builds a normalized catalog of one logbook: n_files pages over volumes
+    (directories) of files_per_dir pages, with archive and platform tags."""
+    volumes = [{
+        'contents': [{
+            'file_path': f'data/vol{d:03}/page{p:04}.jpg',
+            'media_type': 'image/jpeg',
+            'file_size': 2**20 + p,
+            'file_modified_datetime': '2020-05-03T12:00:00',
+            'uuid': f'{d:016x}{p:016x}'}
+            for p in range(files_per_dir)],
+        'document.id_within_archive': str(d),
+        'document.id_within_archive_type': 'volume'}
+        for d in range(n_files // files_per_dir)]
+    tags = {f'archive.{k}': f'archive {k} value' for k in
+            ['name', 'country_code', 'url', 'description']}
+    tags.update({f'platform.{k}': f'platform {k} value' for k in
+            ['name', 'country_code', 'type', 'call_sign', 'description']})
+    return {'contents': volumes, **tags}
+
+##
+
+normalized_catalog = synthetic_catalog()
+print(f"{'records':>16} {'seconds':>10} {'bytes/record':>14}")
+for name, compact in [('dict', False), ('CatalogRecord', True)]:
+    tracemalloc.start()
+    start = perf_counter()
+    catalog = unnormalize_catalog(normalized_catalog, compact=compact)
+    seconds = perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:>16} {seconds:>10.3f} {size / len(catalog):>14.0f}")
+    assert all(isinstance(r, CatalogRecord) == compact for r in catalog)
+    del catalog
+
+##
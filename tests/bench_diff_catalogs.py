@@ -0,0 +1,50 @@
+#! /usr/bin/env python3
+#
+# 2026-10-16
+# CC-0 Public Domain
+
+"""
+Benchmark: time and peak memory to diff two catalogs, with a hash join vs.
+an external sort and merge.
+"""
+
+from context import imagearchive
+from imagearchive.diff import diff_catalogs, diff_sorted, sort_catalog
+
+import tracemalloc
+from collections import Counter
+from time import perf_counter
+
+n_records, chunk_size = 200000, 20000
+
+def synthetic_catalog(n, changed=0, shift=0):
+    """Generates n records in random uuid order; the first 'changed' differ
+    in size, and shift moves the window of records (deletes and inserts)."""
+    for i in range(shift, n + shift):
+        yield {'file_path': f'data/doc{i // 100:05}/page{i % 100:02}.jpg',
+                'media_type': 'image/jpeg',
+                'file_size': i + (i < changed + shift),
+                'uuid': f'{(i * 2654435761) % 2**32:08x}{i:024x}'}
+
+def measure(diff):
+    tracemalloc.start()
+    start = perf_counter()
+    counts = diff()
+    seconds = perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return counts, seconds, peak
+
+##
+
+print(f"{'method':>8} {'seconds':>10} {'peak MiB':>10}  changes")
+for name, diff in [
+        ('hash', lambda: Counter(op for op, _ in diff_catalogs(
+            synthetic_catalog(n_records), synthetic_catalog(n_records, 1000, 500)))),
+        ('sorted', lambda: Counter(op for op, _ in diff_sorted(
+            sort_catalog(synthetic_catalog(n_records), chunk_size=chunk_size),
+            sort_catalog(synthetic_catalog(n_records, 1000, 500), chunk_size=chunk_size))))]:
+    counts, seconds, peak = measure(diff)
+    print(f"{name:>8} {seconds:>10.2f} {peak / 2**20:>10.1f}  {dict(counts)}")
+
+##
@@ -0,0 +1,51 @@
+#! /usr/bin/env python3
+#
+# 2026-10-16
+# CC-0 Public Domain
+
+"""
+Benchmark: insert and lookup throughput for String(36) vs. BinaryUUID keys.
+"""
+
+from context import imagearchive
+from imagearchive.utils import get_fixed_seq, mint_uuid
+from imagearchive.schema import BinaryUUID
+
+import os
+import random
+import tempfile
+from time import perf_counter
+from sqlalchemy import create_engine, MetaData, Table, Column, String, select
+
+n_rows, n_lookups = 100000, 10000
+
+get_fixed_seq()
+uuids = [mint_uuid() for _ in range(n_rows)]
+sample = random.sample(uuids, n_lookups)
+
+##
+
+print(f"{'key type':>12} {'inserts/s':>12} {'lookups/s':>12} {'db bytes':>12}")
+for name, key_type in [('String(36)', String(36)), ('BinaryUUID', BinaryUUID())]:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        engine = create_engine(f'sqlite:///{db_path}')
+        image = Table('image', MetaData(), Column('id', key_type, primary_key=True))
+        image.metadata.create_all(engine)
+
+        with engine.begin() as connection:
+            start = perf_counter()
+            connection.execute(image.insert(), [{'id': u} for u in uuids])
+            inserts = n_rows / (perf_counter() - start)
+
+        with engine.connect() as connection:
+            start = perf_counter()
+            for u in sample:
+                connection.execute(select([image.c.id]).where(image.c.id == u)).scalar()
+            lookups = n_lookups / (perf_counter() - start)
+
+        engine.dispose()
+        print(f"{name:>12} {inserts:>12.0f} {lookups:>12.0f} "\
+                + f"{os.path.getsize(db_path):>12}")
+
+##
@@ -0,0 +1,48 @@
+#! /usr/bin/env python3
+#
+# 2026-10-16
+# CC-0 Public Domain
+
+"""
+Benchmark: import time of each imagearchive module in a fresh interpreter,
+and whether importing it pulls in a heavy dependency.
+"""
+
+from context import imagearchive
+
+import os
+import subprocess
+import sys
+
+n_runs = 10
+modules = ['imagearchive', 'imagearchive.directories', 'imagearchive.config',
+        'imagearchive.utils', 'imagearchive.manifest', 'imagearchive.loader']
+heavy = ['sqlalchemy', 'magic', 'exiftool', 'pandas']
+
+package_root = os.path.dirname(os.path.dirname(os.path.abspath(imagearchive.__file__)))
+script = """
+import sys
+from time import perf_counter
+start = perf_counter()
+import {module}
+print(perf_counter() - start, *[m for m in {heavy} if m in sys.modules])
+"""
+
+def measure(module):
+    """Returns the best import time (s) of module, and heavy modules it loaded."""
+    best, loaded = float('inf'), []
+    for _ in range(n_runs):
+        out = subprocess.run([sys.executable, '-c',
+            script.format(module=module, heavy=heavy)], cwd=package_root,
+            stdout=subprocess.PIPE, check=True).stdout.decode().split()
+        best, loaded = min(best, float(out[0])), out[1:]
+    return best, loaded
+
+##
+
+print(f"{'module':>26} {'ms':>8}  heavy dependencies loaded")
+for module in modules:
+    seconds, loaded = measure(module)
+    print(f"{module:>26} {1000*seconds:>8.1f}  {', '.join(loaded) or '-'}")
+
+##
@@ -0,0 +1,38 @@
+#! /usr/bin/env python3
+#
+# 2026-10-16
+# CC-0 Public Domain
+
+"""
+Benchmark: time to flatten a normalized catalog vs. catalog size.
+"""
+
+from context import imagearchive
+from imagearchive.utils import unnormalize_catalog
+from timeit import timeit
+
+def synthetic_catalog(n_files, files_per_dir=100):
+    """Builds a normalized catalog of n_files images spread over documents
+    (directories) of files_per_dir images, below a single archive."""
+    documents = [{
+        'contents': [{
+            'file_path': f'data/doc{d:05}/page{p:04}.jpg',
+            'media_type': 'image/jpeg',
+            'uuid': f'{d:016x}{p:016x}'}
+            for p in range(min(files_per_dir, n_files - d*files_per_dir))],
+        'document.id_within_archive': str(d),
+        'document.id_within_archive_type': 'naIds'}
+        for d in range(-(-n_files // files_per_dir))]
+    return {'contents': documents,
+            'archive.name': 'National Archives and Records Administration',
+            'platform.name': 'USCG Storis'}
+
+##
+
+print(f"{'files':>10} {'seconds':>10}")
+for n_files in [1000, 10000, 100000]:
+    normalized_catalog = synthetic_catalog(n_files)
+    seconds = timeit(lambda: unnormalize_catalog(normalized_catalog), number=3) / 3
+    print(f"{n_files:>10} {seconds:>10.4f}")
+
+##
@@ -0,0 +1,48 @@
+#! /usr/bin/env python3
+#
+# 2026-10-16
+# CC-0 Public Domain
+
+"""
+Benchmark: uuids minted per second under 1, 8 and 32 concurrent minters.
+"""
+
+from context import imagearchive
+from imagearchive.utils import UuidMinter
+
+from threading import Thread
+from time import perf_counter
+
+n_uuids = 320000
+
+def run(n_threads, target):
+    """Runs target(results) on n_threads threads; returns uuids/s and uuids."""
+    results = [[] for _ in range(n_threads)]
+    threads = [Thread(target=target, args=(r,)) for r in results]
+    start = perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = perf_counter() - start
+    uuids = [u for r in results for u in r]
+    assert len(uuids) == len(set(uuids)) == n_uuids, 'duplicate uuids minted'
+    return n_uuids / seconds
+
+##
+
+print(f"{'minters':>8} {'shared/s':>12} {'blocks/s':>12}")
+for n_threads in [1, 8, 32]:
+    per_thread = n_uuids // n_threads
+    minter = UuidMinter()
+
+    # Every thread mints from the one (locked) minter.
+    shared = run(n_threads, lambda r: r.extend(minter.mint()
+        for _ in range(per_thread)))
+
+    # Every thread mints from its own pre-allocated block.
+    blocks = run(n_threads, lambda r: r.extend(minter.allocate(per_thread)))
+
+    print(f"{n_threads:>8} {shared:>12.0f} {blocks:>12.0f}")
+
+##
@@ -0,0 +1,63 @@
+#! /usr/bin/env python3
+#
+# 2026-10-16
+# CC-0 Public Domain
+
+import pytest
+
+pytest.importorskip('sqlalchemy')
+
+from context import imagearchive
+from imagearchive.schema import Base
+from imagearchive.loader import load_catalog
+from imagearchive.migrations import migrate_natural_keys
+
+from sqlalchemy import create_engine, text
+
+# Archive and platform keys without a country_code, as in today's catalogs.
+catalog = [{'file_path': f'data/doc1/page{i}.jpg', 'media_type': 'image/jpeg',
+    'uuid': f'0000000{i}00001111800000000000000{i}', 'archive.name': 'NARA',
+    'platform.name': 'USS Albatross', 'document.id_within_archive': 'doc1'}
+    for i in range(1, 4)]
+
+def counts(engine):
+    with engine.connect() as connection:
+        return {table: connection.execute(text(f'SELECT COUNT(*) FROM {table}')).scalar()
+                for table in ['archive', 'platform', 'document', 'image']}
+
+@pytest.mark.parametrize('upsert', [True, False])
+def test_load_catalog_twice(upsert):
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    load_catalog(engine, catalog, upsert=upsert)
+    load_catalog(engine, catalog, upsert=upsert)
+    assert counts(engine) == {'archive': 1, 'platform': 1, 'document': 1, 'image': 3}
+
+def test_migrate_natural_keys():
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        # Tables as created before the natural key constraints, holding the
+        # duplicates that loads into them left behind.
+        for table in ['archive', 'platform']:
+            connection.execute(text(f'CREATE TABLE {table} (id INTEGER PRIMARY KEY, '
+                'created_at DATETIME, name VARCHAR(255), country_code VARCHAR(3))'))
+        connection.execute(text('CREATE TABLE document (id INTEGER PRIMARY KEY, '
+            'created_at DATETIME, id_within_archive VARCHAR(255), '
+            'id_within_archive_type VARCHAR(55), start_date DATE, end_date DATE, '
+            'license VARCHAR(55), archive_id INTEGER, platform_id INTEGER)'))
+        Base.metadata.tables['image'].create(connection)
+        connection.execute(text("INSERT INTO archive (name) VALUES ('NARA'), ('NARA')"))
+        connection.execute(text("INSERT INTO platform (name) VALUES ('USS Albatross')"))
+        connection.execute(text("INSERT INTO document (id_within_archive, archive_id, "
+            "platform_id) VALUES ('doc1', 1, 1), ('doc1', 2, 1)"))
+    # Stored NULLs never match the '' of a missing key part, so this adds
+    # one more of each.
+    load_catalog(engine, catalog[:1], upsert=False)
+
+    assert migrate_natural_keys(engine) == {'archive': 2, 'platform': 1, 'document': 2}
+    assert migrate_natural_keys(engine) == {'archive': 0, 'platform': 0, 'document': 0}
+    load_catalog(engine, catalog)
+    assert counts(engine) == {'archive': 1, 'platform': 1, 'document': 1, 'image': 3}
+    with engine.connect() as connection:
+        assert connection.execute(text('SELECT DISTINCT document_id FROM image')).fetchall() == [(1,)]
+        assert connection.execute(text('SELECT archive_id FROM document')).fetchall() == [(1,)]
@@ -0,0 +1,32 @@
+#! /usr/bin/env python3
+#
+# 2026-10-16
+# CC-0 Public Domain
+
+from context import imagearchive
+from imagearchive.directories import Directory
+from imagearchive.transfer import copy_file
+
+import shutil
+
+import pytest
+
+def test_fetch_same_content_twice(tmp_path):
+    src = Directory(abspath=str(tmp_path / 'src'))
+    dst = Directory(abspath=str(tmp_path / 'dst'))
+    (tmp_path / 'src' / 'x.jpg').write_bytes(b'x' * 100)
+
+    for _ in range(2):
+        result = dst.fetch_some_from(src, ['x.jpg'])
+        assert not result.failures
+        assert result.successes == [('x.jpg', 'hardlink')]
+    for _ in range(2):
+        result = dst.fetch_all_from(src)
+        assert not result.failures
+    assert (tmp_path / 'dst' / 'x.jpg').read_bytes() == b'x' * 100
+
+def test_copy_file_onto_itself(tmp_path):
+    path = tmp_path / 'x.jpg'
+    path.write_bytes(b'x')
+    with pytest.raises(shutil.SameFileError):
+        copy_file(str(path), str(tmp_path))
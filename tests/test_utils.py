@@ -0,0 +1,74 @@
+#! /usr/bin/env python3
+#
+# 2026-10-16
+# CC-0 Public Domain
+
+from context import imagearchive
+from imagearchive.utils import ExifToolSession, assign_uuids_batch
+
+import base64
+import shutil
+
+import pytest
+
+# A 1x1 pixel JPEG, small enough to inline.
+jpeg = base64.b64decode(
+        "/9j/4AAQSkZJRgABAQEASABIAAD/2wBDAP////////////////////////////////"
+        "//////////////////////////////////////////////////////wgALCAABAAEB"
+        "AREA/8QAFBABAAAAAAAAAAAAAAAAAAAAAP/aAAgBAQABPxA=")
+
+pytestmark = pytest.mark.skipif(shutil.which('perl') is None,
+        reason='exiftool needs perl')
+
+def test_assign_uuids_batch_missing_file(tmp_path):
+    paths = [str(tmp_path / name) for name in ['a.jpg', 'missing.jpg', 'b.jpg']]
+    for path in paths[::2]:
+        with open(path, 'wb') as f:
+            f.write(jpeg)
+
+    with ExifToolSession() as session:
+        uuids = assign_uuids_batch(paths, session=session)
+        assert uuids[1] is None
+        assert None not in uuids[::2] and uuids[0] != uuids[2]
+        # Already assigned uuids are read back, not rewritten.
+        assert assign_uuids_batch(paths, session=session) == uuids
+        assert assign_uuids_batch(paths[1:2], session=session) == [None]
+
+# Speaks exiftool's -stay_open protocol, but exits on 'crash.jpg'.
+fake_exiftool = """#!{python}
+import json, sys
+args = []
+for line in sys.stdin:
+    arg = line.strip()
+    if arg != '-execute':
+        args.append(arg)
+        continue
+    files = [a for a in args if not a.startswith('-')]
+    if 'crash.jpg' in files:
+        sys.exit(1)
+    print(json.dumps([{{'SourceFile': f, 'EXIF:ImageUniqueID': 'abc'}}
+        for f in files]))
+    print('{{ready}}', flush=True)
+    args = []
+"""
+
+def test_session_restarts_exiftool_that_exits_mid_command(tmp_path):
+    import signal
+    import sys
+    from imagearchive.utils import ExifToolExited
+
+    executable = tmp_path / 'exiftool'
+    executable.write_text(fake_exiftool.format(python=sys.executable))
+    executable.chmod(0o755)
+
+    # A session that waits forever on a dead process fails here instead.
+    signal.alarm(30)
+    try:
+        with ExifToolSession(str(executable)) as session:
+            with pytest.raises(ExifToolExited):
+                session.get_tag('ImageUniqueID', 'crash.jpg')
+            assert session.spawns == 2 and session.restarts == 1
+            assert session.get_tag('ImageUniqueID', 'a.jpg') == 'abc'
+            assert session.spawns == 3
+    finally:
+        signal.alarm(0)